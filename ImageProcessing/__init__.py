@@ -1,3 +1,13 @@
-from .processor import ImageProcessor
+from importlib import import_module
 
-__all__ = ['ImageProcessor']
\ No newline at end of file
+# Exports are imported on first access so that importing a light submodule
+# (errors, timing, uploads) does not load OpenCV, NumPy and PIL
+_EXPORTS = {'ImageProcessor': '.processor', 'PreprocessExecutor': '.executor', 'ImageEncoder': '.encoding'}
+
+__all__ = ['ImageProcessor', 'PreprocessExecutor', 'ImageEncoder']
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        return getattr(import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,133 @@
+from PIL import Image
+from typing import Optional
+import cv2
+import math
+import numpy as np
+import os
+
+# ISO/IEC 7810 ID-1 (the Aadhaar PVC card and most printed cut-outs): 85.60 x 53.98 mm
+ID1_ASPECT = 85.60 / 53.98
+DETECT_MAX_DIM = 512
+
+
+def card_crop_enabled() -> bool:
+    return os.getenv("AADHAAR_CARD_CROP", "true").lower() == "true"
+
+
+def combine_sides_enabled() -> bool:
+    return os.getenv("AADHAAR_COMBINE_SIDES", "false").lower() == "true"
+
+
+def card_min_area() -> float:
+    return float(os.getenv("CARD_MIN_AREA", "0.15"))
+
+
+def crop_decode_size(width: int, height: int, target: int = 1024) -> int:
+    '''
+    Long side to decode a photo at before cropping the card: enough for the smallest card
+    detect_card accepts (CARD_MIN_AREA of the frame) to keep about `target` px, but no more
+    than half the photo so JPEGs still decode at a reduced scale
+    '''
+    needed = math.ceil(target / card_min_area() ** 0.5)
+    return max(target, min(needed, max(width, height) // 2))
+
+
+def card_aspect_tolerance() -> float:
+    return float(os.getenv("CARD_ASPECT_TOLERANCE", "0.2"))
+
+
+def is_card_shaped(width: float, height: float, tolerance: Optional[float] = None) -> bool:
+    '''True if a width x height rectangle (either orientation) has the ID-1 card aspect ratio'''
+    tolerance = card_aspect_tolerance() if tolerance is None else tolerance
+    aspect = max(width, height) / max(1.0, min(width, height))
+    return abs(aspect - ID1_ASPECT) / ID1_ASPECT <= tolerance
+
+
+def detect_card(rgb: np.ndarray, min_area: Optional[float] = None, outermost: bool = False) -> Optional[np.ndarray]:
+    '''
+    Find the card outline in an RGB photo, ignoring candidates below `min_area` of the
+    frame (CARD_MIN_AREA by default). With `outermost`, only the largest outline of each
+    mask is considered, so boxes printed inside the card are never mistaken for it.
+    Returns the four corners (top-left, top-right, bottom-right, bottom-left) in
+    full-resolution coordinates, or None when no confident candidate is found.
+    '''
+    h, w = rgb.shape[:2]
+    scale = min(1.0, DETECT_MAX_DIM / max(h, w))
+    small = cv2.resize(rgb, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA) if scale < 1.0 else rgb
+    gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_RGB2GRAY), (5, 5), 0)
+    frame_area = float(gray.shape[0] * gray.shape[1])
+
+    min_area = card_min_area() if min_area is None else min_area
+
+    edges = cv2.dilate(cv2.Canny(gray, 30, 100), np.ones((3, 3), np.uint8))
+    _, otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+    for mask in (edges, otsu, 255 - otsu):
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:1 if outermost else 5]:
+            hull = cv2.convexHull(contour)
+            area = cv2.contourArea(hull)
+            # Too small to be the card, or the whole frame (nothing to crop)
+            if not min_area <= area / frame_area <= 0.95:
+                continue
+
+            quad = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+            if len(quad) != 4:
+                continue
+            corners = _order_corners(quad.reshape(4, 2).astype(np.float32))
+            if not is_card_shaped(*_quad_size(corners)):
+                continue
+            # The outline must actually fill the quadrilateral, not just touch its corners
+            if area / max(1.0, cv2.contourArea(corners)) < 0.9:
+                continue
+            return corners / scale
+
+    return None
+
+
+def crop_card(img: Image.Image) -> Image.Image:
+    '''
+    Crop and perspective-correct the card in an RGB image.
+    Falls back to the full frame when detection is not confident.
+    '''
+    rgb = np.asarray(img)
+    corners = detect_card(rgb)
+    if corners is None:
+        return img
+
+    width, height = (int(round(v)) for v in _quad_size(corners))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], np.float32)
+    matrix = cv2.getPerspectiveTransform(corners.astype(np.float32), target)
+    warped = cv2.warpPerspective(rgb, matrix, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return Image.fromarray(warped, 'RGB')
+
+
+def combine_sides(front: Image.Image, back: Image.Image, gap: int = 16) -> Image.Image:
+    '''Stack the front above the back at a common width, separated by a white band'''
+    width = min(front.width, back.width)
+    sides = [
+        side if side.width == width else side.resize((width, round(side.height * width / side.width)), Image.Resampling.LANCZOS)
+        for side in (front, back)
+    ]
+    combined = Image.new('RGB', (width, sides[0].height + gap + sides[1].height), (255, 255, 255))
+    combined.paste(sides[0], (0, 0))
+    combined.paste(sides[1], (0, sides[0].height + gap))
+    return combined
+
+
+def _order_corners(points: np.ndarray) -> np.ndarray:
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)]
+    ], np.float32)
+
+
+def _quad_size(corners: np.ndarray):
+    tl, tr, br, bl = corners
+    width = max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))
+    height = max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))
+    return width, height
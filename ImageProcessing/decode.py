@@ -0,0 +1,105 @@
+from PIL import Image
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+import cv2
+import io
+import numpy as np
+import os
+from .errors import ImageLimitError, ImageQualityError
+from .uploads import max_upload_bytes, read_upload
+
+# OpenCV reduced-decode flags by scale; JPEG scales during the DCT, other formats after decoding
+_REDUCED_COLOR_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+def max_image_pixels() -> int:
+    return int(os.getenv("MAX_IMAGE_PIXELS", str(60_000_000)))
+
+
+def decode_memory_budget() -> int:
+    return int(os.getenv("DECODE_MEMORY_BUDGET", str(64 * 1024 * 1024)))
+
+
+@contextmanager
+def decoding() -> Iterator[None]:
+    '''
+    Report an upload that cannot be decoded as a failed 'decode' quality check, so it is
+    rejected instead of being sent to the model as raw bytes
+    '''
+    try:
+        yield
+    except (ImageLimitError, ImageQualityError):
+        raise
+    except Exception as e:
+        print(f"Could not decode image: {e}")
+        raise ImageQualityError([
+            {'check': 'decode', 'value': None, 'threshold': None, 'message': 'image could not be decoded'}
+        ]) from e
+
+
+def probe_size(image_bytes: bytes) -> Tuple[int, int, str]:
+    '''Read width, height and format from the image header without decoding pixels'''
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        width, height = img.size
+        return width, height, img.format
+
+
+def open_reduced(image_bytes: bytes, max_size: int) -> Image.Image:
+    '''
+    Open an image with PIL, letting the JPEG decoder downscale by 1/2, 1/4 or 1/8
+    so the decoded image is only as large as needed for max_size
+    '''
+    img = Image.open(io.BytesIO(image_bytes))
+    width, height = img.size
+    _check_pixels(width, height)
+
+    if img.format == 'JPEG' and max(width, height) > max_size:
+        # Ask for at least max_size on the long side so the later resize still has full detail
+        ratio = max_size / max(width, height)
+        img.draft('RGB', (max(1, int(width * ratio + 0.5)), max(1, int(height * ratio + 0.5))))
+        width, height = img.size
+
+    _check_memory(width, height, len(img.getbands()))
+    return img
+
+
+def decode_reduced_cv2(image_bytes: bytes, max_size: int) -> np.ndarray:
+    '''
+    Decode an image to a BGR array with OpenCV, picking the largest reduced-decode
+    scale that still leaves at least max_size pixels on the long side
+    '''
+    width, height, image_format = probe_size(image_bytes)
+    _check_pixels(width, height)
+
+    scale = 1
+    for candidate in (8, 4, 2):
+        if max(width, height) // candidate >= max_size:
+            scale = candidate
+            break
+    # Only JPEG is actually decoded at the reduced size
+    decoded_scale = scale if image_format == 'JPEG' else 1
+    _check_memory(width // decoded_scale, height // decoded_scale, 3)
+
+    flags = _REDUCED_COLOR_FLAGS.get(scale, cv2.IMREAD_COLOR)
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flags)
+    if img is None:
+        raise ValueError("Could not decode image")
+    return img
+
+
+def _check_pixels(width: int, height: int) -> None:
+    limit = max_image_pixels()
+    if width * height > limit:
+        raise ImageLimitError(f"image is {width}x{height}, more than the {limit} pixel limit")
+
+
+def _check_memory(width: int, height: int, channels: int) -> None:
+    budget = decode_memory_budget()
+    if width * height * channels > budget:
+        raise ImageLimitError(
+            f"decoding a {width}x{height} image needs more than the {budget} byte memory budget"
+        )
@@ -0,0 +1,124 @@
+from typing import Optional
+import cv2
+import numpy as np
+import os
+
+METHODS = ('hough', 'probabilistic', 'projection', 'off')
+
+
+def deskew(image: np.ndarray, method: str = None) -> np.ndarray:
+    '''
+    Straighten a grayscale document.
+    The skew angle is estimated on a downsampled copy with a bounded amount of work,
+    then the full-resolution image is rotated once.
+    DESKEW_METHOD selects 'hough' (default), 'probabilistic', 'projection' or 'off'.
+    '''
+    method = method or os.getenv("DESKEW_METHOD", "hough")
+    if method == 'off':
+        return image
+
+    angle = estimate_skew(image, method)
+    # Only rotate if angle is significant (> 0.5 degrees)
+    if angle is None or abs(angle) <= 0.5:
+        return image
+
+    (h, w) = image.shape[:2]
+    center = (w // 2, h // 2)
+    rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    return cv2.warpAffine(
+        image, rotation_matrix, (w, h),
+        flags=cv2.INTER_CUBIC,
+        borderMode=cv2.BORDER_REPLICATE
+    )
+
+
+def estimate_skew(image: np.ndarray, method: str = 'hough') -> Optional[float]:
+    '''
+    Return the rotation angle in degrees (as passed to cv2.getRotationMatrix2D)
+    that straightens the document, or None when no lines were found
+    '''
+    small, scale = _downsample(image, int(os.getenv("DESKEW_MAX_DIM", "512")))
+    max_lines = int(os.getenv("DESKEW_MAX_LINES", "200"))
+
+    if method == 'hough':
+        return _estimate_hough(small, scale, max_lines)
+    if method == 'probabilistic':
+        return _estimate_probabilistic(small, scale, max_lines)
+    if method == 'projection':
+        return _estimate_projection(small, float(os.getenv("DESKEW_MAX_ANGLE", "15")))
+    raise ValueError(f"Unknown deskew method '{method}', expected one of {', '.join(METHODS)}")
+
+
+def _downsample(image: np.ndarray, max_dim: int):
+    h, w = image.shape[:2]
+    scale = min(1.0, max_dim / max(h, w))
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return image, scale
+
+
+def _to_rotation_angles(angles: np.ndarray) -> np.ndarray:
+    '''Fold line direction angles (degrees, -90..90] onto the nearest axis'''
+    return np.where(angles > 45, angles - 90, np.where(angles < -45, angles + 90, angles))
+
+
+def _estimate_hough(small: np.ndarray, scale: float, max_lines: int) -> Optional[float]:
+    edges = cv2.Canny(small, 50, 150, apertureSize=3)
+    # The vote threshold was tuned for ~1024 px images; scale it with the edge map
+    threshold = max(20, int(100 * scale))
+    lines = cv2.HoughLines(edges, 1, np.pi / 180, threshold=threshold)
+    if lines is None or len(lines) == 0:
+        return None
+
+    # OpenCV returns lines ordered by votes, so the cap keeps the strongest ones
+    theta = np.degrees(lines.reshape(-1, 2)[:max_lines, 1])
+    # The line direction is perpendicular to its normal angle theta
+    return float(np.median(_to_rotation_angles(theta - 90)))
+
+
+def _estimate_probabilistic(small: np.ndarray, scale: float, max_lines: int) -> Optional[float]:
+    edges = cv2.Canny(small, 50, 150, apertureSize=3)
+    min_length = max(small.shape[:2]) // 8
+    lines = cv2.HoughLinesP(
+        edges, 1, np.pi / 180,
+        threshold=max(20, int(80 * scale)),
+        minLineLength=min_length,
+        maxLineGap=max(2, min_length // 10)
+    )
+    if lines is None or len(lines) == 0:
+        return None
+
+    segments = lines.reshape(-1, 4).astype(np.float32)
+    dx = segments[:, 2] - segments[:, 0]
+    dy = segments[:, 3] - segments[:, 1]
+    lengths = np.hypot(dx, dy)
+    # Keep the longest segments; they carry the most reliable orientation
+    keep = np.argsort(lengths)[::-1][:max_lines]
+    directions = np.degrees(np.arctan2(dy[keep], dx[keep]))
+    directions = np.where(directions > 90, directions - 180, np.where(directions <= -90, directions + 180, directions))
+    return float(np.median(_to_rotation_angles(directions)))
+
+
+def _estimate_projection(small: np.ndarray, max_angle: float) -> Optional[float]:
+    '''
+    Projection-profile search: text rows are sharpest (highest row-sum variance)
+    when the page is level. Coarse 1 degree steps are refined to 0.1 degrees.
+    '''
+    _, ink = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    if not ink.any():
+        return None
+    ink = ink.astype(np.float32)
+
+    h, w = ink.shape
+    center = (w / 2, h / 2)
+
+    def score(angle: float) -> float:
+        matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+        rotated = cv2.warpAffine(ink, matrix, (w, h), flags=cv2.INTER_NEAREST, borderValue=0)
+        profile = rotated.sum(axis=1)
+        return float(np.var(profile))
+
+    coarse = np.arange(-max_angle, max_angle + 0.5, 1.0)
+    best = coarse[int(np.argmax([score(a) for a in coarse]))]
+    fine = np.arange(best - 1.0, best + 1.05, 0.1)
+    return float(fine[int(np.argmax([score(a) for a in fine]))])
@@ -0,0 +1,41 @@
+from typing import List
+
+# Kept free of OpenCV/NumPy/PIL imports so the web process can handle these errors
+# without loading the image stack
+
+
+class ImageLimitError(ValueError):
+    '''Raised when an upload exceeds the configured size, pixel or memory limits'''
+
+
+class ImageQualityError(ValueError):
+    '''
+    Raised when an upload is too blurry, washed out, small or badly framed to be worth an LLM call.
+    `reasons` holds one dict per failed check.
+    '''
+    def __init__(self, reasons: List[dict]) -> None:
+        super().__init__(reasons)
+        self.reasons = reasons
+
+    def __str__(self) -> str:
+        return "; ".join(reason['message'] for reason in self.reasons)
+
+
+class UnsupportedDocumentError(ValueError):
+    '''Raised for documents that cannot be read, e.g. a damaged PDF or any PDF without pypdfium2 installed'''
+
+
+def raise_for_sides(results: List[object], sides=('front', 'back')) -> None:
+    '''
+    Raise the failures from processing both sides of a card. Quality failures are merged
+    into a single ImageQualityError with every reason tagged by side; other errors propagate as-is.
+    '''
+    reasons = []
+    for side, result in zip(sides, results):
+        if isinstance(result, ImageQualityError):
+            reasons.extend({**reason, 'side': side} for reason in result.reasons)
+    if reasons:
+        raise ImageQualityError(reasons)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
@@ -0,0 +1,209 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+import time
+from .errors import ImageLimitError, ImageQualityError, raise_for_sides
+from . import timing
+
+
+def _timed(task: str, *args) -> Tuple[object, float, float, Dict[str, float]]:
+    '''
+    Worker entry point: run one preprocessing task and report when the work started and ended,
+    along with the time spent in each stage
+    '''
+    # Imported here so the web process only loads OpenCV/NumPy when it preprocesses in threads
+    from .processor import ImageProcessor
+
+    started = time.monotonic()
+    with timing.collect() as stages:
+        if task == 'aadhaar':
+            # BytesIO shares the received buffer instead of copying it
+            result = ImageProcessor.preprocess_aadhaar_data_url(io.BytesIO(args[0]))
+        elif task == 'aadhaar_image':
+            result = ImageProcessor._enhance_aadhaar(args[0])
+        elif task == 'aadhaar_combine':
+            result = ImageProcessor.combine_aadhaar_data_url(*args)
+        elif task == 'form':
+            result = ImageProcessor.preprocess_form_data_url(io.BytesIO(args[0]))
+        elif task == 'form_sections':
+            result = ImageProcessor.preprocess_form_section_data_urls(io.BytesIO(args[0]), *args[1:])
+        elif task == 'form_page':
+            result = ImageProcessor.preprocess_form_page_data_url(*args)
+        elif task == 'aadhaar_regions':
+            result = ImageProcessor.preprocess_aadhaar_regions_data_urls(*args)
+        elif task == 'form_regions':
+            result = ImageProcessor.preprocess_form_regions_data_urls(*args)
+        else:
+            raise ValueError(f"Unknown preprocessing task: {task}")
+    return result, started, time.monotonic(), stages
+
+
+def _noop() -> None:
+    return None
+
+
+class PreprocessExecutor:
+    '''
+    Runs ImageProcessor work in a pool of worker processes so preprocessing
+    scales with the cores in the container instead of contending for the GIL.
+    Upload bytes are handed to the workers as-is and finished base64 data URLs
+    come back, so the web process does no decoding or encoding of its own.
+    With zero workers the work runs in threads of the calling process instead.
+    '''
+    _default: Optional['PreprocessExecutor'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, workers: Optional[int] = None) -> None:
+        if workers is None:
+            workers = int(os.getenv("PREPROCESS_WORKERS", str(os.cpu_count() or 1)))
+        self.workers = max(0, workers)
+        # forkserver avoids forking a process that already runs an event loop and HTTP threads
+        self._method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._pool = self._create_pool() if self.workers else None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(self._method))
+
+    async def warmup(self, preload: bool = False) -> None:
+        '''
+        Start every worker process now rather than on the first request. With preload the
+        workers fork from a server that has already imported the image stack, so they share
+        its pages and a replacement worker is ready immediately.
+        '''
+        if self._pool is not None:
+            if preload and self._method == 'forkserver':
+                multiprocessing.get_context('forkserver').set_forkserver_preload(['ImageProcessing.processor'])
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self._pool, _noop) for _ in range(self.workers)))
+
+    async def preprocess_aadhaar(self, data: bytes) -> str:
+        return await self._submit('aadhaar', data)
+
+    async def preprocess_aadhaar_pair(self, front: bytes, back: bytes) -> List[str]:
+        '''
+        Preprocess both sides of a card in parallel.
+        Returns one data URL per side, or a single stacked image with AADHAAR_COMBINE_SIDES.
+        '''
+        from .card import combine_sides_enabled
+
+        if combine_sides_enabled():
+            try:
+                images = await asyncio.gather(
+                    self._submit('aadhaar_image', front), self._submit('aadhaar_image', back), return_exceptions=True
+                )
+                raise_for_sides(images)
+                return [await self._submit('aadhaar_combine', *images)]
+            except (ImageLimitError, ImageQualityError):
+                raise
+            except Exception as e:
+                print(f"Error combining Aadhaar images, sending them separately: {e}")
+
+        images = await asyncio.gather(self._submit('aadhaar', front), self._submit('aadhaar', back), return_exceptions=True)
+        raise_for_sides(images)
+        return list(images)
+
+    async def preprocess_form(self, data: bytes) -> str:
+        return await self._submit('form', data)
+
+    async def preprocess_form_sections(self, data: bytes, layout: Optional[str] = None) -> Dict[str, str]:
+        return await self._submit('form_sections', data, layout)
+
+    async def preprocess_form_page(self, document: bytes, index: int) -> str:
+        '''Render and preprocess one page of a PDF/TIFF; the worker holds a single page at a time'''
+        return await self._submit('form_page', document, index)
+
+    async def preprocess_aadhaar_regions(self, data: bytes, bands: List[Tuple[float, float]]) -> List[str]:
+        '''One side of a card, preprocessed once and cropped to bands of its height, for re-reading single fields'''
+        return await self._submit('aadhaar_regions', data, bands)
+
+    async def preprocess_form_regions(
+        self, document: bytes, sections: List[str], page: Optional[int] = None, layout: Optional[str] = None
+    ) -> Dict[str, str]:
+        '''Sections of a form photo or PDF/TIFF page, preprocessed once, for re-reading single fields'''
+        return await self._submit('form_regions', document, sections, page, layout)
+
+    async def _submit(self, task: str, *args):
+        submitted = time.monotonic()
+        with self._lock:
+            self._pending += 1
+        try:
+            if self._pool is None:
+                result, started, finished, stages = await asyncio.to_thread(_timed, task, *args)
+            else:
+                pool = self._pool
+                try:
+                    result, started, finished, stages = await asyncio.get_running_loop().run_in_executor(pool, _timed, task, *args)
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed for memory); replace the pool for later requests
+                    self._replace_pool(pool)
+                    raise
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self._failed += 1
+            raise
+
+        wait = max(0.0, started - submitted)
+        timing.merge(stages)
+        timing.record('preprocess_wait', wait)
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._run_total += finished - started
+        return result
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is broken:
+                self._pool = self._create_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed or 1
+            return {
+                'workers': self.workers,
+                'mode': 'process' if self._pool is not None else 'thread',
+                'pending': self._pending,
+                'queue_depth': max(0, self._pending - self.workers) if self.workers else 0,
+                'completed': self._completed,
+                'failed': self._failed,
+                'avg_wait_ms': round(self._wait_total / completed * 1000, 2),
+                'max_wait_ms': round(self._wait_max * 1000, 2),
+                'avg_run_ms': round(self._run_total / completed * 1000, 2)
+            }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    @classmethod
+    def get_default(cls) -> 'PreprocessExecutor':
+        '''Return the process-wide executor, creating it on first use'''
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = cls()
+        return cls._default
+
+    @classmethod
+    def shutdown_default(cls) -> None:
+        with cls._default_lock:
+            instance, cls._default = cls._default, None
+        if instance is not None:
+            instance.shutdown()
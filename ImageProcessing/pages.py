@@ -0,0 +1,112 @@
+from PIL import Image, ImageSequence
+from typing import Optional
+import io
+import os
+from .decode import _check_memory, _check_pixels
+from .errors import ImageLimitError, UnsupportedDocumentError
+
+TIFF_SIGNATURES = (b'II*\x00', b'MM\x00*')
+
+
+def page_dpi() -> int:
+    return int(os.getenv("FORM_PAGE_DPI", "150"))
+
+
+def max_pages() -> int:
+    return int(os.getenv("FORM_MAX_PAGES", "10"))
+
+
+def document_kind(data: bytes) -> str:
+    ''''pdf', 'tiff' (possibly multi-page) or 'image' for everything else'''
+    if data.startswith(b'%PDF'):
+        return 'pdf'
+    if data.startswith(TIFF_SIGNATURES):
+        return 'tiff'
+    return 'image'
+
+
+def is_paged(data: bytes) -> bool:
+    '''True for documents that go through the page-by-page pipeline'''
+    return document_kind(data) != 'image'
+
+
+def page_count(data: bytes) -> int:
+    '''Number of pages, without rendering any of them; raises ImageLimitError above FORM_MAX_PAGES'''
+    kind = document_kind(data)
+    if kind == 'pdf':
+        pdf = _open_pdf(data)
+        try:
+            count = len(pdf)
+        finally:
+            pdf.close()
+    elif kind == 'tiff':
+        with Image.open(io.BytesIO(data)) as img:
+            count = getattr(img, 'n_frames', 1)
+    else:
+        count = 1
+
+    limit = max_pages()
+    if count > limit:
+        raise ImageLimitError(f"document has {count} pages, more than the {limit} page limit")
+    return count
+
+
+def render_page(data: bytes, index: int, dpi: Optional[int] = None) -> Image.Image:
+    '''
+    Decode a single page as a grayscale image at `dpi`. Only this page is rendered,
+    so memory does not grow with the number of pages.
+    '''
+    dpi = dpi or page_dpi()
+    kind = document_kind(data)
+    if kind == 'pdf':
+        return _render_pdf_page(data, index, dpi)
+    if kind == 'tiff':
+        return _decode_tiff_page(data, index, dpi)
+    if index != 0:
+        raise IndexError(f"page {index + 1} does not exist")
+    return Image.open(io.BytesIO(data)).convert('L')
+
+
+def _open_pdf(data: bytes):
+    try:
+        import pypdfium2
+    except ImportError:
+        raise UnsupportedDocumentError("PDF uploads need the optional pypdfium2 package")
+    try:
+        return pypdfium2.PdfDocument(data)
+    except pypdfium2.PdfiumError as e:
+        raise UnsupportedDocumentError(f"Could not read PDF: {e}")
+
+
+def _render_pdf_page(data: bytes, index: int, dpi: int) -> Image.Image:
+    pdf = _open_pdf(data)
+    try:
+        page = pdf[index]
+        try:
+            # PDF user space is 72 units per inch
+            scale = dpi / 72
+            width, height = page.get_size()
+            width, height = int(width * scale), int(height * scale)
+            _check_pixels(width, height)
+            _check_memory(width, height, 1)
+            return page.render(scale=scale, grayscale=True).to_pil().convert('L')
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+
+
+def _decode_tiff_page(data: bytes, index: int, dpi: int) -> Image.Image:
+    with Image.open(io.BytesIO(data)) as img:
+        frame = ImageSequence.Iterator(img)[index]
+        width, height = frame.size
+        _check_pixels(width, height)
+        _check_memory(width, height, len(frame.getbands()))
+
+        page = frame.convert('L')
+        # Scans above the target DPI are reduced so later stages see the same scale as PDFs
+        source_dpi = float(frame.info.get('dpi', (dpi, dpi))[0] or dpi)
+        if source_dpi > dpi:
+            scale = dpi / source_dpi
+            page = page.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.Resampling.BOX)
+        return page
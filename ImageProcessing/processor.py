@@ -1,9 +1,17 @@
 import cv2
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
-import io
+from PIL import Image, ImageEnhance
 import base64
-from typing import Union, Tuple
+from typing import Dict, List, Optional, Union, Tuple
+from .card import card_crop_enabled, combine_sides, combine_sides_enabled, crop_card, crop_decode_size
+from .decode import ImageLimitError, decode_reduced_cv2, decoding, open_reduced, probe_size
+from .deskew import deskew
+from .encoding import ImageEncoder, sniff_mime_type, to_data_url
+from .enhance import enhance_aadhaar
+from .pages import render_page
+from .quality import ImageQualityError, check_quality, quality_gate_enabled, raise_for_sides
+from .regions import FORM_SECTIONS, locate_sections
+from .timing import stage
 
 class ImageProcessor:
     """
@@ -12,74 +20,235 @@ class ImageProcessor:
     """
     
     @staticmethod
-    def preprocess_aadhaar_image(image_file) -> bytes:
+    def preprocess_aadhaar_image(image_file, encoder: ImageEncoder = None) -> bytes:
         """
         Preprocess Aadhaar card images for better OCR
         Focus: Sharpening, contrast enhancement, noise reduction
         """
+        encoder = encoder or ImageEncoder.for_document('aadhaar')
+        return ImageProcessor._preprocess(image_file, ImageProcessor._enhance_aadhaar, encoder, 'Aadhaar', data_url=False)
+
+    @staticmethod
+    def preprocess_aadhaar_data_url(image_file, encoder: ImageEncoder = None) -> str:
+        """Preprocess an Aadhaar card image and return it as a base64 data URL"""
+        encoder = encoder or ImageEncoder.for_document('aadhaar')
+        return ImageProcessor._preprocess(image_file, ImageProcessor._enhance_aadhaar, encoder, 'Aadhaar', data_url=True)
+
+    @staticmethod
+    def preprocess_form_image(image_file, encoder: ImageEncoder = None) -> bytes:
+        """
+        Preprocess membership form images for better OCR
+        Focus: Binarization, deskewing, noise removal, contrast enhancement
+        """
+        encoder = encoder or ImageEncoder.for_document('form')
+        return ImageProcessor._preprocess(image_file, ImageProcessor._binarize_form, encoder, 'form', data_url=False)
+
+    @staticmethod
+    def preprocess_form_data_url(image_file, encoder: ImageEncoder = None) -> str:
+        """Preprocess a membership form image and return it as a base64 data URL"""
+        encoder = encoder or ImageEncoder.for_document('form')
+        return ImageProcessor._preprocess(image_file, ImageProcessor._binarize_form, encoder, 'form', data_url=True)
+
+    @staticmethod
+    def preprocess_form_section_data_urls(image_file, layout: str = None, encoder: ImageEncoder = None) -> Dict[str, str]:
+        """
+        Preprocess a membership form once and crop it into one data URL per section
+        (see ImageProcessing.regions). Every section gets the whole page if cropping fails.
+        """
+        encoder = encoder or ImageEncoder.for_document('form')
         try:
-            # Read image bytes
             image_bytes = image_file.read()
-            
-            # Convert to PIL Image
-            img = Image.open(io.BytesIO(image_bytes))
-            
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize to optimal dimensions (keep aspect ratio)
-            img = ImageProcessor._resize_image(img, max_size=1024)
-            
-            # Enhance contrast for better text visibility
-            contrast_enhancer = ImageEnhance.Contrast(img)
-            img = contrast_enhancer.enhance(1.3)
-            
-            # Enhance sharpness for crisp text
-            sharpness_enhancer = ImageEnhance.Sharpness(img)
-            img = sharpness_enhancer.enhance(1.5)
-            
-            # Apply slight denoising
-            img = img.filter(ImageFilter.SMOOTH_MORE)
-            
-            # Convert back to bytes
-            output_buffer = io.BytesIO()
-            img.save(output_buffer, format='PNG', optimize=True, quality=95)
-            
-            return output_buffer.getvalue()
-            
+            img = ImageProcessor._binarize_form(image_bytes)
+            with stage('sections'):
+                bands = locate_sections(np.asarray(img), layout)
+            return {
+                name: encoder.encode_data_url(img.crop((0, top, img.width, bottom)))
+                for name, (top, bottom) in bands.items()
+            }
+
+        except (ImageLimitError, ImageQualityError):
+            raise
         except Exception as e:
-            print(f"Error processing Aadhaar image: {e}")
-            # Return original bytes if processing fails
+            print(f"Error splitting form into sections: {e}")
             image_file.seek(0)
-            return image_file.read()
-    
+            page = ImageProcessor.preprocess_form_data_url(image_file, encoder)
+            return {name: page for name in FORM_SECTIONS}
+
     @staticmethod
-    def preprocess_form_image(image_file) -> bytes:
+    def preprocess_form_page_data_url(document: bytes, index: int, encoder: ImageEncoder = None) -> str:
         """
-        Preprocess membership form images for better OCR
-        Focus: Binarization, deskewing, noise removal, contrast enhancement
+        Render one page of a PDF/TIFF (see ImageProcessing.pages) and preprocess it like
+        a form photo. Only this page is held in memory.
+        """
+        encoder = encoder or ImageEncoder.for_document('form')
+        return encoder.encode_data_url(ImageProcessor._binarize_page(document, index))
+
+    @staticmethod
+    def preprocess_form_regions_data_urls(
+        document: bytes, sections: List[str], page: Optional[int] = None, layout: str = None, encoder: ImageEncoder = None
+    ) -> Dict[str, str]:
+        """
+        Preprocess a form photo, or one page of a PDF/TIFF, once and crop it to each of
+        `sections` (see ImageProcessing.regions) for re-reading single fields
         """
+        encoder = encoder or ImageEncoder.for_document('form')
+        img = ImageProcessor._binarize_form(document) if page is None else ImageProcessor._binarize_page(document, page)
+        with stage('sections'):
+            bands = locate_sections(np.asarray(img), layout)
+        # Sections sharing a band (e.g. the whole page with layout 'full') are encoded once
+        encoded = {}
+        for section in sections:
+            top, bottom = bands[section]
+            if (top, bottom) not in encoded:
+                encoded[top, bottom] = encoder.encode_data_url(img.crop((0, top, img.width, bottom)))
+        return {section: encoded[bands[section]] for section in sections}
+
+    @staticmethod
+    def preprocess_aadhaar_regions_data_urls(
+        image_bytes: bytes, bands: List[Tuple[float, float]], encoder: ImageEncoder = None
+    ) -> List[str]:
+        """
+        Preprocess one side of a card once and crop it to each horizontal band, given as
+        fractions of the card height, for re-reading single fields
+        """
+        encoder = encoder or ImageEncoder.for_document('aadhaar')
+        img = ImageProcessor._enhance_aadhaar(image_bytes)
+        crops = []
+        for top, bottom in bands:
+            top, bottom = int(top * img.height), int(bottom * img.height)
+            crops.append(encoder.encode_data_url(img.crop((0, top, img.width, max(bottom, top + 1)))))
+        return crops
+
+    @staticmethod
+    def _preprocess(image_file, pipeline, encoder: ImageEncoder, label: str, data_url: bool) -> Union[bytes, str]:
         try:
             # Read image bytes
             image_bytes = image_file.read()
-            
-            # Convert to OpenCV format
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                raise ValueError("Could not decode image")
-            
-            # Resize to optimal dimensions
+
+            img = pipeline(image_bytes)
+            return encoder.encode_data_url(img) if data_url else encoder.encode(img)
+
+        except (ImageLimitError, ImageQualityError):
+            # Oversized or undecodable uploads must never fall through to the model unprocessed
+            raise
+        except Exception as e:
+            print(f"Error processing {label} image: {e}")
+            # The upload decoded, so the model can still read the original bytes
+            image_file.seek(0)
+            original = image_file.read()
+            return to_data_url(sniff_mime_type(original), original) if data_url else original
+
+    @staticmethod
+    def preprocess_aadhaar_pair_data_urls(front_file, back_file, encoder: ImageEncoder = None) -> List[str]:
+        """
+        Preprocess both sides of a card into data URLs.
+        With AADHAAR_COMBINE_SIDES the sides are stacked into a single image (front on top).
+        """
+        if combine_sides_enabled():
+            try:
+                sides = [ImageProcessor._capture(ImageProcessor._enhance_aadhaar, f.read()) for f in (front_file, back_file)]
+                raise_for_sides(sides)
+                return [ImageProcessor.combine_aadhaar_data_url(*sides, encoder)]
+            except (ImageLimitError, ImageQualityError):
+                raise
+            except Exception as e:
+                print(f"Error combining Aadhaar images, sending them separately: {e}")
+                front_file.seek(0)
+                back_file.seek(0)
+
+        sides = [ImageProcessor._capture(ImageProcessor.preprocess_aadhaar_data_url, f, encoder) for f in (front_file, back_file)]
+        raise_for_sides(sides)
+        return sides
+
+    @staticmethod
+    def _capture(fn, *args):
+        """Call fn and return its exception instead of raising, so both card sides get checked"""
+        try:
+            return fn(*args)
+        except Exception as e:
+            return e
+
+    @staticmethod
+    def combine_aadhaar_data_url(front: Image.Image, back: Image.Image, encoder: ImageEncoder = None) -> str:
+        """Stack preprocessed front and back images into one data URL"""
+        encoder = encoder or ImageEncoder.for_document('aadhaar')
+        with stage('combine'):
+            combined = combine_sides(front, back)
+        return encoder.encode_data_url(combined)
+
+    @staticmethod
+    def _enhance_aadhaar(image_bytes: bytes) -> Image.Image:
+        crop = card_crop_enabled()
+
+        # Convert to PIL Image, letting JPEGs decode at a reduced scale.
+        # When cropping, keep extra resolution so the card itself still ends up near 1024 px.
+        with stage('decode'), decoding():
+            original_size = probe_size(image_bytes)[:2]
+            img = open_reduced(image_bytes, max_size=crop_decode_size(*original_size) if crop else 1024)
+            # Image.open and draft() are lazy; decode here so the time is not charged to later stages
+            img.load()
+
+            # Convert to RGB if necessary
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+
+        # Reject blurry, overexposed, tiny or badly framed photos before any heavy work
+        if quality_gate_enabled():
+            with stage('quality'):
+                check_quality(np.asarray(img), original_size, 'aadhaar')
+
+        # Crop to the card and correct perspective; keeps the full frame if detection isn't confident
+        if crop:
+            with stage('crop'):
+                img = crop_card(img)
+
+        # Resize to optimal dimensions (keep aspect ratio)
+        with stage('resize'):
+            img = ImageProcessor._resize_image(img, max_size=1024)
+
+        # Contrast, sharpening and denoising
+        with stage('enhance'):
+            return enhance_aadhaar(img)
+
+    @staticmethod
+    def _binarize_form(image_bytes: bytes) -> Image.Image:
+        # Convert to OpenCV format, decoding at a reduced scale where possible
+        with stage('decode'), decoding():
+            img = decode_reduced_cv2(image_bytes, max_size=1024)
+
+        # Resize to optimal dimensions
+        with stage('resize'):
             img = ImageProcessor._resize_opencv_image(img, max_size=1024)
-            
+
             # Convert to grayscale
             gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Deskew the image (correct rotation)
+
+        return ImageProcessor._binarize_gray(gray, probe_size(image_bytes)[:2])
+
+    @staticmethod
+    def _binarize_page(document: bytes, index: int) -> Image.Image:
+        with stage('render'):
+            page = render_page(document, index)
+            original_size = page.size
+
+        with stage('resize'):
+            gray = ImageProcessor._resize_opencv_image(np.asarray(page), max_size=1024)
+            del page
+
+        return ImageProcessor._binarize_gray(gray, original_size)
+
+    @staticmethod
+    def _binarize_gray(gray: np.ndarray, original_size: Tuple[int, int]) -> Image.Image:
+        # Reject blurry, overexposed, tiny or badly framed scans before any heavy work
+        if quality_gate_enabled():
+            with stage('quality'):
+                check_quality(gray, original_size, 'form')
+
+        # Deskew the image (correct rotation)
+        with stage('deskew'):
             gray = ImageProcessor._deskew_image(gray)
-            
+
+        with stage('binarize'):
             # Apply adaptive thresholding for better text contrast
             # This is crucial for forms with uneven lighting or faint text
             binary = cv2.adaptiveThreshold(
@@ -88,31 +257,19 @@ class ImageProcessor:
                 cv2.THRESH_BINARY,
                 35, 11
             )
-            
+
             # Remove noise using morphological operations
             kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
             binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
             binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
-            
+
             # Convert back to PIL for final enhancements
             pil_img = Image.fromarray(binary)
-            
+
             # Enhance sharpness for handwritten text
             sharpness_enhancer = ImageEnhance.Sharpness(pil_img)
-            pil_img = sharpness_enhancer.enhance(2.0)
-            
-            # Convert back to bytes
-            output_buffer = io.BytesIO()
-            pil_img.save(output_buffer, format='PNG', optimize=True)
-            
-            return output_buffer.getvalue()
-            
-        except Exception as e:
-            print(f"Error processing form image: {e}")
-            # Return original bytes if processing fails
-            image_file.seek(0)
-            return image_file.read()
-    
+            return sharpness_enhancer.enhance(2.0)
+
     @staticmethod
     def _resize_image(img: Image.Image, max_size: int = 1024) -> Image.Image:
         """Resize PIL image while maintaining aspect ratio"""
@@ -139,57 +296,16 @@ class ImageProcessor:
     @staticmethod
     def _deskew_image(image: np.ndarray) -> np.ndarray:
         """
-        Correct skewed/rotated documents using Hough Line Transform
+        Correct skewed/rotated documents; the angle is estimated on a downsampled
+        edge map (see ImageProcessing.deskew for the available estimators)
         """
         try:
-            # Create a copy to work with
-            skewed = image.copy()
-            
-            # Apply edge detection
-            edges = cv2.Canny(skewed, 50, 150, apertureSize=3)
-            
-            # Detect lines using Hough Line Transform
-            lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
-            
-            if lines is not None and len(lines) > 0:
-                # Calculate the most common angle
-                angles = []
-                for line in lines:
-                    rho, theta = line[0]
-                    angle = theta * 180 / np.pi
-                    # Convert to rotation angle
-                    if angle < 45:
-                        angles.append(angle)
-                    elif angle > 135:
-                        angles.append(angle - 180)
-                    else:
-                        angles.append(angle - 90)
-                
-                if angles:
-                    # Use median angle to avoid outliers
-                    rotation_angle = np.median(angles)
-                    
-                    # Only rotate if angle is significant (> 0.5 degrees)
-                    if abs(rotation_angle) > 0.5:
-                        # Get image center and rotation matrix
-                        (h, w) = image.shape[:2]
-                        center = (w // 2, h // 2)
-                        rotation_matrix = cv2.getRotationMatrix2D(center, rotation_angle, 1.0)
-                        
-                        # Perform rotation
-                        rotated = cv2.warpAffine(
-                            image, rotation_matrix, (w, h),
-                            flags=cv2.INTER_CUBIC,
-                            borderMode=cv2.BORDER_REPLICATE
-                        )
-                        return rotated
-            
-            return image
-            
+            return deskew(image)
+
         except Exception as e:
             print(f"Deskewing failed: {e}")
             return image
-    
+
     @staticmethod
     def encode_to_base64(image_bytes: bytes) -> str:
         """Convert processed image bytes to base64 string"""
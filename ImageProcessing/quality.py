@@ -0,0 +1,161 @@
+from typing import Dict, Optional
+import cv2
+import numpy as np
+import os
+from .card import detect_card, is_card_shaped
+from .errors import ImageQualityError, raise_for_sides
+
+QUALITY_MAX_DIM = 512
+# Smallest card outline measured for the fill check; far below CARD_MIN_AREA so that
+# cards too small to crop are reported instead of going undetected
+FILL_DETECT_MIN_AREA = 0.02
+# A frame this close to the ID-1 aspect is taken to be already cropped to the card;
+# tighter than CARD_ASPECT_TOLERANCE so that 4:3 and 3:2 photos do not qualify
+FRAME_ASPECT_TOLERANCE = 0.05
+# Saturated regions whose holes (ink) cover more than this share of them are printed
+# paper, not glare; highlights wash the print out and keep only a few specks
+GLARE_MAX_INK = 0.1
+# Share of the frame's edge that must be pure white for the upload to count as a scan or render
+SCAN_WHITE_EDGE = 0.9
+
+# Per document type defaults; each can be overridden with <DOCUMENT>_<NAME>, e.g. AADHAAR_MIN_SHARPNESS
+_DEFAULTS = {
+    'aadhaar': {'MIN_SHARPNESS': 20.0, 'MAX_GLARE': 0.25, 'MIN_RESOLUTION': 400, 'MIN_FILL': 0.15},
+    # Scanned forms are mostly white paper, so saturated pixels are not treated as glare by default
+    'form': {'MIN_SHARPNESS': 20.0, 'MAX_GLARE': 1.0, 'MIN_RESOLUTION': 600, 'MIN_FILL': 0.3}
+}
+
+
+def quality_gate_enabled() -> bool:
+    return os.getenv("QUALITY_GATE", "true").lower() == "true"
+
+
+def thresholds(document_type: str) -> Dict[str, float]:
+    prefix = document_type.upper()
+    return {
+        name: float(os.getenv(f"{prefix}_{name}", str(default)))
+        for name, default in _DEFAULTS[document_type].items()
+    }
+
+
+def assess_quality(image: np.ndarray, original_size, document_type: str) -> Dict[str, Optional[float]]:
+    '''
+    Measure an RGB or grayscale image on a downsampled copy:
+    sharpness (variance of the Laplacian), glare (fraction of the document, or of the frame
+    when it cannot be located, covered by blown-out highlights), resolution (short side of
+    the original upload) and fill (fraction of the frame covered by the document; None when
+    it cannot be located). Flat white background, as in scans, PDF renders and screenshots,
+    is neither glare nor unfilled frame.
+    '''
+    h, w = image.shape[:2]
+    scale = min(1.0, QUALITY_MAX_DIM / max(h, w))
+    small = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+    gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY) if small.ndim == 3 else small
+
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+    saturated = (gray >= 250).astype(np.uint8)
+
+    if document_type == 'aadhaar':
+        if _white_edge(saturated) >= SCAN_WHITE_EDGE:
+            # A scanner lid or e-Aadhaar page around the card: the page is the document
+            fill = 1.0
+        else:
+            fill = _card_fill(small) if small.ndim == 3 else None
+    else:
+        fill = _page_fill(gray)
+    glare = _glare(saturated)
+    if fill:
+        glare = min(1.0, glare / fill)
+
+    return {
+        'sharpness': round(sharpness, 2),
+        'glare': round(glare, 4),
+        'resolution': min(original_size),
+        'fill': None if fill is None else round(fill, 4)
+    }
+
+
+def check_quality(image: np.ndarray, original_size, document_type: str) -> Dict[str, Optional[float]]:
+    '''Run the quality gate; raises ImageQualityError listing every failed check'''
+    metrics = assess_quality(image, original_size, document_type)
+    limits = thresholds(document_type)
+    reasons = []
+
+    if metrics['sharpness'] < limits['MIN_SHARPNESS']:
+        reasons.append(_reason('blur', metrics['sharpness'], limits['MIN_SHARPNESS'], "image is too blurry to read"))
+    if metrics['glare'] > limits['MAX_GLARE']:
+        reasons.append(_reason('glare', metrics['glare'], limits['MAX_GLARE'], "image is overexposed or has strong glare"))
+    if metrics['resolution'] < limits['MIN_RESOLUTION']:
+        reasons.append(_reason('resolution', metrics['resolution'], limits['MIN_RESOLUTION'], "image resolution is too low"))
+    if metrics['fill'] is not None and metrics['fill'] < limits['MIN_FILL']:
+        reasons.append(_reason('fill', metrics['fill'], limits['MIN_FILL'], "document covers too little of the photo"))
+
+    if reasons:
+        raise ImageQualityError(reasons)
+    return metrics
+
+
+def _reason(check: str, value: float, threshold: float, message: str) -> dict:
+    return {'check': check, 'value': value, 'threshold': threshold, 'message': message}
+
+
+def _glare(saturated: np.ndarray) -> float:
+    '''
+    Fraction of the frame covered by blown-out blobs. Saturated regions touching the frame
+    edge (scanner lids, page margins, white canvases) and those with print inside them
+    (white paper) are background, not glare.
+    '''
+    contours, hierarchy = cv2.findContours(saturated, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarchy is None:
+        return 0.0
+    hierarchy = hierarchy[0]
+    h, w = saturated.shape
+    area = 0.0
+    for index, contour in enumerate(contours):
+        # Holes are visited through their outer contour
+        if hierarchy[index][3] != -1:
+            continue
+        x, y, bw, bh = cv2.boundingRect(contour)
+        if x == 0 or y == 0 or x + bw == w or y + bh == h:
+            continue
+        holes = []
+        child = hierarchy[index][2]
+        while child != -1:
+            holes.append(contours[child])
+            child = hierarchy[child][0]
+        outer = cv2.contourArea(contour)
+        ink = sum(cv2.contourArea(hole) for hole in holes)
+        if outer <= 0 or ink > GLARE_MAX_INK * outer:
+            continue
+        area += outer - ink
+    return area / saturated.size
+
+
+def _white_edge(saturated: np.ndarray) -> float:
+    '''Fraction of the one-pixel frame edge that is saturated'''
+    edge = np.concatenate([saturated[0], saturated[-1], saturated[1:-1, 0], saturated[1:-1, -1]])
+    return float(np.count_nonzero(edge)) / max(1, edge.size)
+
+
+def _card_fill(rgb: np.ndarray) -> Optional[float]:
+    h, w = rgb.shape[:2]
+    # Scans and screenshots already cropped to the card: the outline is the frame itself
+    if is_card_shaped(w, h, FRAME_ASPECT_TOLERANCE):
+        return 1.0
+    # Only the outermost outline is measured; boxes printed on the card are not the card
+    corners = detect_card(rgb, min_area=FILL_DETECT_MIN_AREA, outermost=True)
+    if corners is None:
+        return None
+    return float(cv2.contourArea(corners.astype(np.float32))) / (rgb.shape[0] * rgb.shape[1])
+
+
+def _page_fill(gray: np.ndarray) -> Optional[float]:
+    # Paper is brighter than its background; take the largest bright region
+    _, paper = cv2.threshold(cv2.GaussianBlur(gray, (5, 5), 0), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # Close over printed rules and handwriting so the page forms one region
+    paper = cv2.morphologyEx(paper, cv2.MORPH_CLOSE, np.ones((9, 9), np.uint8))
+    contours, _ = cv2.findContours(paper, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    hull = cv2.convexHull(max(contours, key=cv2.contourArea))
+    return float(cv2.contourArea(hull)) / gray.size
@@ -0,0 +1,92 @@
+from typing import Dict, Optional, Tuple
+import cv2
+import json
+import numpy as np
+import os
+
+FORM_SECTIONS = ('applicant', 'nominee', 'bank', 'payment', 'introducer', 'signatures')
+LAYOUTS = ('template', 'detect', 'full')
+
+# Vertical band of each section as fractions of the page height (top, bottom).
+# Neighbouring bands overlap so a field on a boundary is visible to both sections.
+_DEFAULT_TEMPLATE = {
+    'applicant': (0.0, 0.46),
+    'nominee': (0.40, 0.60),
+    'bank': (0.54, 0.72),
+    'payment': (0.66, 0.82),
+    'introducer': (0.76, 0.92),
+    'signatures': (0.80, 1.0)
+}
+
+
+# Where each locally validated Aadhaar field is printed: the card side and a vertical band
+# as fractions of the cropped card height, generous enough for a loose crop
+AADHAAR_FIELD_REGIONS = {
+    'aadhaar_number': ('front', (0.55, 1.0)),
+    'date_of_birth': ('front', (0.2, 0.8)),
+    'issue_date': ('front', (0.0, 1.0)),
+    'pincode': ('back', (0.15, 0.9))
+}
+
+
+def section_layout() -> str:
+    return os.getenv("FORM_SECTION_LAYOUT", "template")
+
+
+def section_template() -> Dict[str, Tuple[float, float]]:
+    '''
+    Section bands, with FORM_SECTION_TEMPLATE (JSON, e.g. {"bank": [0.5, 0.7]}) overriding the defaults
+    '''
+    template = dict(_DEFAULT_TEMPLATE)
+    override = os.getenv("FORM_SECTION_TEMPLATE")
+    if override:
+        for name, (top, bottom) in json.loads(override).items():
+            if name not in template:
+                raise ValueError(f"Unknown form section '{name}', expected one of {', '.join(FORM_SECTIONS)}")
+            template[name] = (float(top), float(bottom))
+    return template
+
+
+def locate_sections(binary: np.ndarray, layout: Optional[str] = None) -> Dict[str, Tuple[int, int]]:
+    '''
+    Return the (top, bottom) pixel rows of every section on a preprocessed form
+    (black ink on white). 'template' uses the fixed bands, 'detect' snaps each band
+    edge to the nearest printed horizontal rule and 'full' gives every section the whole page.
+    '''
+    layout = layout or section_layout()
+    height = binary.shape[0]
+    if layout == 'full':
+        return {name: (0, height) for name in FORM_SECTIONS}
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown form section layout '{layout}', expected one of {', '.join(LAYOUTS)}")
+
+    rules = find_rules(binary) if layout == 'detect' else np.empty(0, np.int64)
+    tolerance = float(os.getenv("FORM_SECTION_SNAP", "0.04")) * height
+
+    bands = {}
+    for name, (top, bottom) in section_template().items():
+        top = _snap(int(top * height), rules, tolerance)
+        bottom = _snap(int(bottom * height), rules, tolerance)
+        bands[name] = (max(0, top), min(height, max(bottom, top + 1)))
+    return bands
+
+
+def find_rules(binary: np.ndarray) -> np.ndarray:
+    '''Row indices of long horizontal rules (table borders, section dividers)'''
+    ink = (binary < 128).astype(np.uint8)
+    # Opening with a wide flat kernel keeps only strokes spanning a quarter of the page
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, binary.shape[1] // 4), 1))
+    lines = cv2.morphologyEx(ink, cv2.MORPH_OPEN, kernel)
+    rows = np.flatnonzero(lines.any(axis=1))
+    if rows.size == 0:
+        return rows
+    # Collapse the rows of a thick rule into its centre
+    groups = np.split(rows, np.flatnonzero(np.diff(rows) > 1) + 1)
+    return np.array([int(group.mean()) for group in groups])
+
+
+def _snap(row: int, rules: np.ndarray, tolerance: float) -> int:
+    if rules.size == 0:
+        return row
+    nearest = rules[np.argmin(np.abs(rules - row))]
+    return int(nearest) if abs(nearest - row) <= tolerance else row
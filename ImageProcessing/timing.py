@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+import time
+
+# Stage name -> cumulative seconds for the current request, job or worker task.
+# Tasks and threads started from a context share its dict, so concurrent stages add up.
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def collect() -> Iterator[Dict[str, float]]:
+    '''Start a fresh set of stage timings for the code run inside the block'''
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    '''Time the block as `name`; a no-op outside collect()'''
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def record(name: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def merge(other: Dict[str, float]) -> None:
+    '''Add timings measured elsewhere (e.g. in a worker process) to the current context'''
+    for name, seconds in other.items():
+        record(name, seconds)
+
+
+def server_timing(timings: Dict[str, float], total: Optional[float] = None) -> str:
+    '''Format timings as a Server-Timing header value (durations in milliseconds)'''
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
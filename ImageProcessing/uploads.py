@@ -0,0 +1,20 @@
+import os
+from .errors import ImageLimitError
+from .timing import stage
+
+
+def max_upload_bytes() -> int:
+    return int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+
+
+def read_upload(image_file, limit: int = None) -> bytes:
+    '''
+    Read an uploaded file, refusing anything larger than MAX_UPLOAD_BYTES
+    without reading past the limit
+    '''
+    limit = limit or max_upload_bytes()
+    with stage('read'):
+        data = image_file.read(limit + 1)
+    if len(data) > limit:
+        raise ImageLimitError(f"upload exceeds the {limit} byte limit")
+    return data
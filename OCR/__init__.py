@@ -1,5 +1,20 @@
-from .aadhaar import AadhaarExtractor
-from .details import Aadhaar_Details, Membership_Form
-from .form import MembershipFormExtractor
+from importlib import import_module
 
-__all__ = ['AadhaarExtractor', 'MembershipFormExtractor', 'Aadhaar_Details', 'Membership_Form']
\ No newline at end of file
+# Exports are imported on first access so that importing the client, cache or errors
+# does not load langchain and the image stack
+_EXPORTS = {
+    'AadhaarExtractor': '.aadhaar',
+    'MembershipFormExtractor': '.form',
+    'Aadhaar_Details': '.details',
+    'Membership_Form': '.details',
+    'LLMClientRegistry': '.client',
+    'ExtractionCache': '.cache'
+}
+
+__all__ = ['AadhaarExtractor', 'MembershipFormExtractor', 'Aadhaar_Details', 'Membership_Form', 'LLMClientRegistry', 'ExtractionCache']
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        return getattr(import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,78 +1,164 @@
-from langchain_openai import AzureChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
-from dotenv import load_dotenv
-import os
+from typing import List
+import asyncio
+import io
+from .cache import ExtractionCache
+from .client import LLMClientRegistry
 from .details import Aadhaar_Details
+from . import validation
+from ImageProcessing.decode import read_upload
+from ImageProcessing.executor import PreprocessExecutor
 from ImageProcessing.processor import ImageProcessor
-
-load_dotenv()
+from ImageProcessing.regions import AADHAAR_FIELD_REGIONS
+from Service.metrics import PAYLOAD_BYTES, UPLOAD_BYTES
 
 class AadhaarExtractor:
     '''
     This class is for OCR extraction from Aadhaar Cards
     '''
-    def __init__(self, user_aadhaar_image_front, user_aadhaar_image_back) -> None:
-        self.model = AzureChatOpenAI(
-            deployment_name='gpt-5-mini',  # Use your actual deployment name
-            api_version="2024-08-01-preview",
-            azure_endpoint=os.getenv("OPENAI_API_BASE"),
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
-        self.structured_model = self.model.with_structured_output(Aadhaar_Details)
+    # Bump whenever the prompt or schema changes so cached results are not reused
+    PROMPT_VERSION = 'aadhaar-v2'
+
+    def __init__(
+        self,
+        user_aadhaar_image_front,
+        user_aadhaar_image_back,
+        registry: LLMClientRegistry = None,
+        cache: ExtractionCache = None,
+        executor: PreprocessExecutor = None
+    ) -> None:
+        registry = registry or LLMClientRegistry.get()
+        self.registry = registry
+        self.model = registry.model
+        self.structured_model = registry.structured_model(Aadhaar_Details)
+        self.cache = cache or ExtractionCache.get_default()
+        self.executor = executor or PreprocessExecutor.get_default()
         self.user_aadhaar_image_front = user_aadhaar_image_front
         self.user_aadhaar_image_back = user_aadhaar_image_back
 
     def read_aadhaar(self) -> dict:
         if self.user_aadhaar_image_front and self.user_aadhaar_image_back:
+            front_bytes = read_upload(self.user_aadhaar_image_front)
+            back_bytes = read_upload(self.user_aadhaar_image_back)
+            self._observe_uploads(front_bytes, back_bytes)
+
+            key = ExtractionCache.make_key('aadhaar', self.PROMPT_VERSION, front_bytes, back_bytes)
+            if self.cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+
             # Preprocess both images for better OCR
-            front_processed_bytes = ImageProcessor.preprocess_aadhaar_image(self.user_aadhaar_image_front)
-            back_processed_bytes = ImageProcessor.preprocess_aadhaar_image(self.user_aadhaar_image_back)
-            
-            # Encode to base64
-            front_image = ImageProcessor.encode_to_base64(front_processed_bytes)
-            back_image = ImageProcessor.encode_to_base64(back_processed_bytes)
-
-            # Messages
-            message = [
-                SystemMessage(
-                    content=(
-                        """
-                            You are an expert OCR system specialized in extracting information from Indian Aadhaar cards. Please analyze this image and extract ALL visible information in the exact JSON format specified below.
-
-                            Extract the following information from this Aadhaar card image:
-
-                            {
-                            "aadhaar_number": "extract the 12-digit Aadhaar number (without spaces/hyphens or extra characters)",
-                            "name": "full name of the cardholder",
-                            "father_husband_name": "father's or husband's name if visible",
-                            "date_of_birth": "date of birth in DD/MM/YYYY format",
-                            "gender": ["Male", "Female", "Transgender"],
-                            "address": "complete address including house number, street, area, city, state",
-                            "pincode": "pincode",
-                            "issue_date": "issue date if visible",
-                            }
-
-                            IMPORTANT INSTRUCTIONS:
-                            - Extract ONLY information that is clearly visible and readable
-                            - If a field is not visible, return the JSON value null (do not write the string "null")
-                            - Ensure the Aadhaar number is exactly 12 digits
-                            - Maintain exact spelling and formatting as shown on the card
-                            - For address, include all visible components in proper sequence
-                            - Double-check all extracted numbers for accuracy
-                            - If text is partially obscured or unclear, mark as "partially_visible: [what you can see]"
-
-                            Return ONLY the JSON response, no additional text or explanation.
-                        """
-                    )
-                ),
-                HumanMessage(
-                    content=[
-                        {"type": "text", "text": "Extract the text from these Aadhaar images."},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{front_image}"}},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{back_image}"}}
-                    ]
-                )
-            ]    
+            images = ImageProcessor.preprocess_aadhaar_pair_data_urls(io.BytesIO(front_bytes), io.BytesIO(back_bytes))
+
+            self._observe_payloads(images)
+            response = self.registry.invoke(self.structured_model, self._build_messages(images))
+            sides = {'front': front_bytes, 'back': back_bytes}
+
+            def crop(side, bands):
+                images = ImageProcessor.preprocess_aadhaar_regions_data_urls(sides[side], bands)
+                self._observe_payloads(images)
+                return {band: (self._region_label(side), image) for band, image in zip(bands, images)}
+
+            result = validation.repair('aadhaar', response.model_dump(), self.registry, AADHAAR_FIELD_REGIONS, crop)
+            if self.cache:
+                self.cache.set(key, result)
+            return result
+
+    async def aread_aadhaar(self) -> dict:
+        '''
+        Async variant of read_aadhaar: preprocessing runs in the worker pool and the
+        model call uses ainvoke, so the event loop is never blocked
+        '''
+        if self.user_aadhaar_image_front and self.user_aadhaar_image_back:
+            front_bytes, back_bytes = await asyncio.gather(
+                asyncio.to_thread(read_upload, self.user_aadhaar_image_front),
+                asyncio.to_thread(read_upload, self.user_aadhaar_image_back)
+            )
+            self._observe_uploads(front_bytes, back_bytes)
+            if not self.cache:
+                return await self._aextract(front_bytes, back_bytes)
+
+            key = await asyncio.to_thread(ExtractionCache.make_key, 'aadhaar', self.PROMPT_VERSION, front_bytes, back_bytes)
+            return await self.cache.get_or_compute(key, lambda: self._aextract(front_bytes, back_bytes))
+
+    async def _aextract(self, front_bytes: bytes, back_bytes: bytes) -> dict:
+        # Preprocess both sides in parallel in the preprocessing worker pool
+        images = await self.executor.preprocess_aadhaar_pair(front_bytes, back_bytes)
+        self._observe_payloads(images)
 
-            response = self.structured_model.invoke(message)
-            return response.model_dump()
\ No newline at end of file
+        response = await self.registry.ainvoke(self.structured_model, self._build_messages(images))
+        sides = {'front': front_bytes, 'back': back_bytes}
+
+        async def crop(side, bands):
+            images = await self.executor.preprocess_aadhaar_regions(sides[side], bands)
+            self._observe_payloads(images)
+            return {band: (self._region_label(side), image) for band, image in zip(bands, images)}
+
+        # Fields that fail local checks (e.g. the Verhoeff checksum) are re-read on their own
+        return await validation.arepair('aadhaar', response.model_dump(), self.registry, AADHAAR_FIELD_REGIONS, crop)
+
+    @staticmethod
+    def _observe_uploads(*uploads: bytes) -> None:
+        for upload in uploads:
+            UPLOAD_BYTES.labels('aadhaar').observe(len(upload))
+
+    @staticmethod
+    def _region_label(side: str) -> str:
+        return f"part of the {side} side of an Aadhaar card"
+
+    @staticmethod
+    def _observe_payloads(images: List[str]) -> None:
+        for image in images:
+            PAYLOAD_BYTES.labels('aadhaar').observe(len(image))
+
+    @staticmethod
+    def _build_messages(images: List[str]) -> list:
+        '''
+        Build the prompt for the preprocessed card images (base64 data URLs): either
+        front and back separately, or a single image with the front stacked above the back
+        '''
+        if len(images) == 1:
+            instruction = "Extract the text from this Aadhaar image. The front of the card is on top and the back is below it."
+        else:
+            instruction = "Extract the text from these Aadhaar images."
+
+        return [
+            SystemMessage(
+                content=(
+                    """
+                        You are an expert OCR system specialized in extracting information from Indian Aadhaar cards. Please analyze this image and extract ALL visible information in the exact JSON format specified below.
+
+                        Extract the following information from this Aadhaar card image:
+
+                        {
+                        "aadhaar_number": "extract the 12-digit Aadhaar number (without spaces/hyphens or extra characters)",
+                        "name": "full name of the cardholder",
+                        "father_husband_name": "father's or husband's name if visible",
+                        "date_of_birth": "date of birth in DD/MM/YYYY format",
+                        "gender": ["Male", "Female", "Transgender"],
+                        "address": "complete address including house number, street, area, city, state",
+                        "pincode": "pincode",
+                        "issue_date": "issue date if visible",
+                        }
+
+                        IMPORTANT INSTRUCTIONS:
+                        - Extract ONLY information that is clearly visible and readable
+                        - If a field is not visible, return the JSON value null (do not write the string "null")
+                        - Ensure the Aadhaar number is exactly 12 digits
+                        - Maintain exact spelling and formatting as shown on the card
+                        - For address, include all visible components in proper sequence
+                        - Double-check all extracted numbers for accuracy
+                        - If text is partially obscured or unclear, mark as "partially_visible: [what you can see]"
+
+                        Return ONLY the JSON response, no additional text or explanation.
+                    """
+                )
+            ),
+            HumanMessage(
+                content=[
+                    {"type": "text", "text": instruction},
+                    *({"type": "image_url", "image_url": {"url": image}} for image in images)
+                ]
+            )
+        ]
\ No newline at end of file
@@ -0,0 +1,218 @@
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ExtractionCache:
+    '''
+    Content-addressed cache for extraction results.
+    Entries are keyed by a hash of the raw upload bytes, the document type and the
+    prompt version. A bounded in-memory LRU tier with TTL sits in front of an optional
+    SQLite tier, and concurrent requests for the same key share a single computation.
+    '''
+    _default: Optional['ExtractionCache'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 600,
+        disk_path: Optional[str] = None
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+        self._disk = None
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(document_type: str, prompt_version: str, *payloads: bytes) -> str:
+        '''Hash the raw uploads together with the document type and prompt version'''
+        digest = hashlib.sha256()
+        digest.update(f"{document_type}:{prompt_version}".encode("utf-8"))
+        for payload in payloads:
+            # Length-prefix each payload so (a, bc) and (ab, c) never collide
+            digest.update(len(payload).to_bytes(8, "big"))
+            digest.update(payload)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return json.loads(value)
+                self._remove(key)
+                self._counters['expirations'] += 1
+
+        value = self._disk_get(key)
+        if value is not None:
+            self._counters['disk_hits'] += 1
+            self._memory_set(key, value)
+            return json.loads(value)
+
+        self._counters['misses'] += 1
+        return None
+
+    def set(self, key: str, result: dict) -> None:
+        value = json.dumps(result)
+        self._memory_set(key, value)
+        self._disk_set(key, value)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+        '''
+        Return the cached result for key, or run compute once for all concurrent callers.
+        If the caller running compute is cancelled, one of the waiting callers takes over.
+        '''
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            result = await asyncio.shield(inflight)
+            if result is not None:
+                self._counters['coalesced'] += 1
+                return json.loads(json.dumps(result))
+            # The computing caller was cancelled; the first waiter to wake up takes over
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await asyncio.to_thread(self.get, key) if self._disk else self.get(key)
+            if result is None:
+                result = await compute()
+                if self._disk:
+                    await asyncio.to_thread(self.set, key, result)
+                else:
+                    self.set(key, result)
+        except asyncio.CancelledError:
+            # Wake the waiters without a result instead of cancelling them too
+            future.set_result(None)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return json.loads(json.dumps(result))
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'inflight': len(self._inflight),
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'disk_tier': self._disk is not None
+            }
+
+    def close(self) -> None:
+        if self._disk is not None:
+            with self._lock:
+                self._disk.close()
+                self._disk = None
+
+    def _memory_set(self, key: str, value: str) -> None:
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._counters['evictions'] += 1
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._size -= len(value)
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        if self._disk is None:
+            return None
+        with self._lock:
+            row = self._disk.execute(
+                "SELECT value, expires_at FROM extraction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= time.time():
+                self._disk.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                self._disk.commit()
+                self._counters['expirations'] += 1
+                return None
+            return value
+
+    def _disk_set(self, key: str, value: str) -> None:
+        if self._disk is None:
+            return
+        with self._lock:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl_seconds)
+            )
+            self._disk.commit()
+
+    @classmethod
+    def get_default(cls) -> Optional['ExtractionCache']:
+        '''Return the process-wide cache configured from the environment, or None if disabled'''
+        if os.getenv("CACHE_ENABLED", "true").lower() != "true":
+            return None
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = cls(
+                        max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+                        max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+                        ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "600")),
+                        disk_path=os.getenv("CACHE_DISK_PATH") or None
+                    )
+        return cls._default
+
+    @classmethod
+    def shutdown(cls) -> None:
+        with cls._default_lock:
+            instance, cls._default = cls._default, None
+        if instance is not None:
+            instance.close()
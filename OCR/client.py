@@ -0,0 +1,169 @@
+from typing import Dict, Optional
+import threading
+import httpx
+import os
+from .details import FORM_SECTION_SCHEMAS, Aadhaar_Details, Membership_Form, Membership_Form_Page
+from .scheduler import LLMScheduler, scheduler_enabled
+from ImageProcessing.timing import stage
+from Service.metrics import LLM_CALLS, LLM_TOKENS
+from Service.startup import load_config
+
+load_config()
+
+
+class LLMClientRegistry:
+    '''
+    Process-wide registry for the pooled Azure OpenAI client.
+    The HTTP connection pools, the chat model and the structured-output runnables
+    are built once and shared by every extractor instead of being rebuilt per request.
+    '''
+    _instance: Optional['LLMClientRegistry'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        pool_size: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None
+    ) -> None:
+        # Imported with the first registry rather than at service startup
+        from langchain_openai import AzureChatOpenAI
+
+        pool_size = pool_size or int(os.getenv("LLM_POOL_SIZE", "100"))
+        connect_timeout = connect_timeout or float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+        read_timeout = read_timeout or float(os.getenv("LLM_READ_TIMEOUT", "60"))
+        # The scheduler owns retries when enabled, so the SDK does not retry underneath it by default.
+        # Sync calls never go through the scheduler and keep the SDK's own retries.
+        self.scheduler = LLMScheduler.from_env() if scheduler_enabled() else None
+        if max_retries is None and os.getenv("LLM_MAX_RETRIES") is not None:
+            max_retries = int(os.getenv("LLM_MAX_RETRIES"))
+        sync_retries = 2 if max_retries is None else max_retries
+        if max_retries is None:
+            max_retries = 0 if self.scheduler else 2
+
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+
+        self.azure_endpoint = os.getenv("OPENAI_API_BASE")
+        self.model = AzureChatOpenAI(
+            deployment_name=os.getenv("AZURE_DEPLOYMENT_NAME", "gpt-5-mini"),
+            api_version=os.getenv("OPENAI_API_VERSION", "2024-08-01-preview"),
+            azure_endpoint=self.azure_endpoint,
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=timeout,
+            max_retries=max_retries,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client
+        )
+        if sync_retries != max_retries:
+            self.model.root_client = self.model.root_client.with_options(max_retries=sync_retries)
+            self.model.client = self.model.root_client.chat.completions
+        self._structured_models: Dict[type, object] = {}
+        self._schema_names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def structured_model(self, schema: type):
+        '''
+        Return the cached structured-output runnable for a Pydantic schema.
+        The raw message is kept alongside the parsed result so token usage can be recorded;
+        call it through invoke/ainvoke to get the parsed object back.
+        '''
+        runnable = self._structured_models.get(schema)
+        if runnable is None:
+            with self._lock:
+                runnable = self._structured_models.get(schema)
+                if runnable is None:
+                    runnable = self.model.with_structured_output(schema, include_raw=True)
+                    self._structured_models[schema] = runnable
+                    self._schema_names[id(runnable)] = schema.__name__
+        return runnable
+
+    def invoke(self, runnable, messages: list):
+        '''Call a structured model synchronously and return the parsed schema object'''
+        name = self._schema_names.get(id(runnable), 'unknown')
+        with stage('llm'):
+            try:
+                response = runnable.invoke(messages)
+            except Exception:
+                LLM_CALLS.labels(name, 'error').inc()
+                raise
+        return self._unwrap(name, response)
+
+    async def ainvoke(self, runnable, messages: list):
+        '''
+        Call a structured model through the quota-aware scheduler (or directly when it is disabled)
+        and return the parsed schema object
+        '''
+        name = self._schema_names.get(id(runnable), 'unknown')
+        with stage('llm'):
+            try:
+                if self.scheduler is None:
+                    response = await runnable.ainvoke(messages)
+                else:
+                    response = await self.scheduler.ainvoke(runnable, messages)
+            except Exception:
+                LLM_CALLS.labels(name, 'error').inc()
+                raise
+        return self._unwrap(name, response)
+
+    @staticmethod
+    def _unwrap(name: str, response):
+        if not isinstance(response, dict):
+            LLM_CALLS.labels(name, 'ok').inc()
+            return response
+
+        usage = getattr(response.get('raw'), 'usage_metadata', None)
+        if usage:
+            LLM_TOKENS.labels(name, 'input').inc(usage.get('input_tokens', 0))
+            LLM_TOKENS.labels(name, 'output').inc(usage.get('output_tokens', 0))
+
+        if response.get('parsing_error') is not None:
+            LLM_CALLS.labels(name, 'parse_error').inc()
+            raise response['parsing_error']
+        if response.get('parsed') is None:
+            LLM_CALLS.labels(name, 'parse_error').inc()
+            raise ValueError(f"model returned no {name} output")
+        LLM_CALLS.labels(name, 'ok').inc()
+        return response['parsed']
+
+    async def warmup(self, connect: bool = False) -> None:
+        '''
+        Compile the structured models for every known schema and, if requested,
+        open a pooled connection to the Azure endpoint so the first request skips TLS setup
+        '''
+        for schema in (Aadhaar_Details, Membership_Form, Membership_Form_Page, *FORM_SECTION_SCHEMAS.values()):
+            self.structured_model(schema)
+
+        if connect and self.azure_endpoint:
+            try:
+                await self.http_async_client.get(self.azure_endpoint)
+            except httpx.HTTPError as e:
+                print(f"LLM connection warm-up failed: {e}")
+
+    async def aclose(self) -> None:
+        await self.http_async_client.aclose()
+        self.http_client.close()
+
+    @classmethod
+    def get(cls) -> 'LLMClientRegistry':
+        '''Return the process-wide registry, creating it on first use'''
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def current(cls) -> Optional['LLMClientRegistry']:
+        '''The process-wide registry if it has been created, without creating it'''
+        return cls._instance
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        with cls._instance_lock:
+            instance, cls._instance = cls._instance, None
+        if instance is not None:
+            await instance.aclose()
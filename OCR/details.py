@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, create_model
 from typing import Annotated, Optional
 
 class Aadhaar_Details(BaseModel):
@@ -17,9 +17,9 @@ class Aadhaar_Details(BaseModel):
     pincode: Optional[Annotated[str, Field(None, description="pincode")]] = None
     issue_date: Optional[Annotated[str, Field(None, description="issue date if visible")]] = None
 
-class Membership_Form(BaseModel):
+class Applicant_Details(BaseModel):
     '''
-    Pydantic class for membership form data_validity
+    Pydantic class for the applicant information section of the membership form
     '''
     # Applicant info
     applicant_name: Annotated[str, Field(description="Full name of the applicant")]
@@ -34,6 +34,10 @@ class Membership_Form(BaseModel):
     occupation: Optional[Annotated[str, Field(description="Occupation of the applicant")]] = None
     nationality: Optional[Annotated[str, Field(description="Nationality of the applicant")]] = None
 
+class Nominee_Details(BaseModel):
+    '''
+    Pydantic class for the nominee details section of the membership form
+    '''
     # Nominee details
     nominee_name: Optional[Annotated[str, Field(description="Name of the nominee")]] = None
     nominee_date_of_birth: Optional[Annotated[str, Field(description="Nominee's date of birth in DD/MM/YYYY format")]] = None
@@ -41,21 +45,64 @@ class Membership_Form(BaseModel):
     nominee_sex: Optional[Annotated[str, Field(description="Nominee's sex: M/F")]] = None
     nominee_relationship: Optional[Annotated[str, Field(description="Relationship of nominee with applicant")]] = None
 
+class Bank_Details(BaseModel):
+    '''
+    Pydantic class for the bank details section of the membership form
+    '''
     # Bank details
     bank_name: Optional[Annotated[str, Field(description="Name and branch of the bank")]] = None
     bank_account_no: Optional[Annotated[str, Field(description="Bank account number")]] = None
     ifsc_code: Optional[Annotated[str, Field(description="IFSC code of the bank")]] = None
 
+class Payment_Details(BaseModel):
+    '''
+    Pydantic class for the payment details section of the membership form
+    '''
     # Payment details
     amount_paid: Optional[Annotated[float, Field(description="Membership amount paid in numbers")]] = None
     amount_in_words: Optional[Annotated[str, Field(description="Membership amount in words")]] = None
     transaction_number: Optional[Annotated[str, Field(description="Transaction Number in words")]] = None
 
+class Introducer_Details(BaseModel):
+    '''
+    Pydantic class for the introducer details section of the membership form
+    '''
     # Introducer details
     introducer_name: Optional[Annotated[str, Field(description="Name of the introducer")]] = None
     introducer_code_no: Optional[Annotated[str, Field(description="Introducer's code number")]] = None
 
+class Signature_Details(BaseModel):
+    '''
+    Pydantic class for the signature presence flags section of the membership form
+    '''
     # Signature presence flags
     introducer_signature_present: Optional[Annotated[bool, Field(description="True if introducer's signature is present, False if absent")]] = None
     member_signature_present: Optional[Annotated[bool, Field(description="True if member's signature is present, False if absent")]] = None
-    official_signature_present: Optional[Annotated[bool, Field(description="True if official's signature is present, False if absent")]] = None
\ No newline at end of file
+    official_signature_present: Optional[Annotated[bool, Field(description="True if official's signature is present, False if absent")]] = None
+
+# Composed from the per-section models; bases are listed in reverse so fields keep form order
+class Membership_Form(Signature_Details, Introducer_Details, Payment_Details, Bank_Details, Nominee_Details, Applicant_Details):
+    '''
+    Pydantic class for membership form data_validity
+    '''
+
+# Section name -> sub-schema, used for section-parallel extraction
+FORM_SECTION_SCHEMAS = {
+    'applicant': Applicant_Details,
+    'nominee': Nominee_Details,
+    'bank': Bank_Details,
+    'payment': Payment_Details,
+    'introducer': Introducer_Details,
+    'signatures': Signature_Details
+}
+
+# Every field optional: one page of a multi-page form only carries some of the sections
+Membership_Form_Page = create_model(
+    'Membership_Form_Page',
+    __doc__='Pydantic class for the fields visible on one page of a multi-page membership form',
+    **{
+        name: (Optional[field.annotation] if field.is_required() else field.annotation,
+               Field(None, description=field.description))
+        for name, field in Membership_Form.model_fields.items()
+    }
+)
\ No newline at end of file
@@ -1,90 +1,371 @@
-from langchain_openai import AzureChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
-from dotenv import load_dotenv
 from typing import Dict
+import asyncio
+import io
 import os
-from .details import Membership_Form
+from .cache import ExtractionCache
+from .client import LLMClientRegistry
+from .details import FORM_SECTION_SCHEMAS, Membership_Form, Membership_Form_Page
+from . import validation
+from ImageProcessing.decode import read_upload
+from ImageProcessing.executor import PreprocessExecutor
+from ImageProcessing.pages import is_paged, page_count
 from ImageProcessing.processor import ImageProcessor
+from ImageProcessing.quality import ImageQualityError, raise_for_sides
+from ImageProcessing.regions import section_layout
+from Service.metrics import PAYLOAD_BYTES, UPLOAD_BYTES
 
-load_dotenv()
+# Field -> form section it is printed in, for cropping when a single field is re-read
+FIELD_SECTIONS = {field: section for section, schema in FORM_SECTION_SCHEMAS.items() for field in schema.model_fields}
 
 class MembershipFormExtractor:
 
-    def __init__(self, form) -> None:
+    # Bump whenever the prompt or schema changes so cached results are not reused
+    PROMPT_VERSION = 'form-v2'
+    SECTION_PROMPT_VERSION = 'form-sections-v2'
+    PAGE_PROMPT_VERSION = 'form-pages-v2'
+
+    def __init__(
+        self,
+        form,
+        registry: LLMClientRegistry = None,
+        cache: ExtractionCache = None,
+        executor: PreprocessExecutor = None
+    ) -> None:
         self.form = form
-        self.model = AzureChatOpenAI(
-            deployment_name='gpt-5-mini',  # Use your actual deployment name
-            api_version="2024-08-01-preview",
-            azure_endpoint=os.getenv("OPENAI_API_BASE"),
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
-        self.structured_model = self.model.with_structured_output(Membership_Form)
+        registry = registry or LLMClientRegistry.get()
+        self.registry = registry
+        self.model = registry.model
+        self.structured_model = registry.structured_model(Membership_Form)
+        # FORM_EXTRACTION_MODE=sections extracts each form section with its own smaller schema, concurrently
+        self.mode = os.getenv("FORM_EXTRACTION_MODE", "single")
+        if self.mode not in ('single', 'sections'):
+            raise ValueError(f"Unknown form extraction mode: {self.mode}")
+        self.layout = section_layout()
+        self.section_models = {
+            name: registry.structured_model(schema) for name, schema in FORM_SECTION_SCHEMAS.items()
+        } if self.mode == 'sections' else {}
+        # PDF/TIFF uploads are extracted page by page with an all-optional schema
+        self.page_model = registry.structured_model(Membership_Form_Page)
+        self.page_concurrency = max(1, int(os.getenv("FORM_PAGE_CONCURRENCY", "2")))
+        self.cache = cache or ExtractionCache.get_default()
+        self.executor = executor or PreprocessExecutor.get_default()
 
     def read_form(self) -> Dict:
         '''
         Function to read and extract the extract output of the Form and return the JSON
         '''
         if self.form:
-            # Preprocess the form image for better OCR accuracy
-            form_processed_bytes = ImageProcessor.preprocess_form_image(self.form)
-            
-            # Encode to base64
-            form_image = ImageProcessor.encode_to_base64(form_processed_bytes)
-
-        message = [
-                SystemMessage(
-                    content=(
-                        """
-                            You are an information extraction assistant.  
-                        You will be given an image of a "Membership Form" that has been preprocessed for optimal OCR.
-
-                        Your task:  
-                        - Extract only the fields that have been filled in the form.  
-                        - If a field is blank, do not include it in the JSON.  
-                        - Map the extracted values to the keys of the provided Pydantic schema.  
-                        - Dates must be returned in DD/MM/YYYY format.  
-                        - Numbers (age, amount_paid) should be integers/floats, not strings.  
-                        - For signatures: return True if a signature is present, False if absent.  
-                        - Do not add extra keys or explanations — only return the JSON object.  
-                        - Pay special attention to handwritten entries as they may appear bolder due to preprocessing.
-
-                        Schema fields to capture:  
-                        - applicant_name  
-                        - date_of_birth  
-                        - age  
-                        - pan_number  
-                        - aadhaar_card  
-                        - father_or_spouse_name  
-                        - address  
-                        - phone_mobile_no  
-                        - email_id  
-                        - occupation  
-                        - nationality  
-                        - nominee_name  
-                        - nominee_date_of_birth  
-                        - nominee_age  
-                        - nominee_sex  
-                        - nominee_relationship  
-                        - bank_name  
-                        - bank_account_no  
-                        - ifsc_code  
-                        - amount_paid  
-                        - amount_in_words  
-                        - introducer_name  
-                        - introducer_code_no  
-                        - introducer_signature_present  
-                        - member_signature_present  
-                        - official_signature_present  
-                        """
-                    )
-                ),
-                HumanMessage(
-                    content=[
-                        {"type": "text", "text": "Extract the filled details from this preprocessed membership form."},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{form_image}"}}
-                    ]
+            form_bytes = read_upload(self.form)
+            UPLOAD_BYTES.labels('membership_form').observe(len(form_bytes))
+
+            key = ExtractionCache.make_key('membership_form', self._prompt_version(form_bytes), form_bytes)
+            if self.cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+
+            # Page each field was read from, for re-reading it from the same page
+            sources = {}
+            if is_paged(form_bytes):
+                result = self._read_pages(form_bytes, sources)
+            elif self.mode == 'sections':
+                images = ImageProcessor.preprocess_form_section_data_urls(io.BytesIO(form_bytes), self.layout)
+                self._observe_payloads(images.values())
+                result = self._merge_sections([
+                    self.registry.invoke(self.section_models[name], self._build_section_messages(name, images[name]))
+                    for name in FORM_SECTION_SCHEMAS
+                ])
+            else:
+                # Preprocess the form image for better OCR accuracy
+                form_image = ImageProcessor.preprocess_form_data_url(io.BytesIO(form_bytes))
+                self._observe_payloads([form_image])
+
+                response = self.registry.invoke(self.structured_model, self._build_messages(form_image))
+                result = response.model_dump()
+
+            def crop(page, sections):
+                images = ImageProcessor.preprocess_form_regions_data_urls(form_bytes, sections, page, self._region_layout(page))
+                self._observe_payloads(images.values())
+                return {section: (self._region_label(section, page), image) for section, image in images.items()}
+
+            result = validation.repair('membership_form', result, self.registry, self._field_regions(sources), crop)
+            if self.cache:
+                self.cache.set(key, result)
+            return result
+
+    async def aread_form(self) -> Dict:
+        '''
+        Async variant of read_form: preprocessing runs in the worker pool and the
+        model call uses ainvoke, so the event loop is never blocked
+        '''
+        if self.form:
+            form_bytes = await asyncio.to_thread(read_upload, self.form)
+            UPLOAD_BYTES.labels('membership_form').observe(len(form_bytes))
+            if not self.cache:
+                return await self._aextract(form_bytes)
+
+            key = await asyncio.to_thread(ExtractionCache.make_key, 'membership_form', self._prompt_version(form_bytes), form_bytes)
+            return await self.cache.get_or_compute(key, lambda: self._aextract(form_bytes))
+
+    async def _aextract(self, form_bytes: bytes) -> Dict:
+        sources = {}
+        result = await self._aextract_form(form_bytes, sources)
+
+        async def crop(page, sections):
+            images = await self.executor.preprocess_form_regions(form_bytes, sections, page, self._region_layout(page))
+            self._observe_payloads(images.values())
+            return {section: (self._region_label(section, page), image) for section, image in images.items()}
+
+        # Fields that fail local checks (Aadhaar checksum, PAN/IFSC format, dates) are re-read on their own
+        return await validation.arepair('membership_form', result, self.registry, self._field_regions(sources), crop)
+
+    async def _aextract_form(self, form_bytes: bytes, sources: Dict[str, int]) -> Dict:
+        if is_paged(form_bytes):
+            return await self._aextract_pages(form_bytes, sources)
+        if self.mode == 'sections':
+            return await self._aextract_sections(form_bytes)
+
+        form_image = await self.executor.preprocess_form(form_bytes)
+        self._observe_payloads([form_image])
+
+        response = await self.registry.ainvoke(self.structured_model, self._build_messages(form_image))
+        return response.model_dump()
+
+    async def _aextract_sections(self, form_bytes: bytes) -> Dict:
+        '''
+        One structured call per section, all in flight at once: latency follows the slowest
+        section instead of the full form's output length
+        '''
+        images = await self.executor.preprocess_form_sections(form_bytes, self.layout)
+        self._observe_payloads(images.values())
+        responses = await asyncio.gather(*(
+            self.registry.ainvoke(self.section_models[name], self._build_section_messages(name, images[name]))
+            for name in FORM_SECTION_SCHEMAS
+        ))
+        return self._merge_sections(responses)
+
+    def _read_pages(self, form_bytes: bytes, sources: Dict[str, int]) -> Dict:
+        '''Sync variant of _aextract_pages: one page at a time'''
+        count = page_count(form_bytes)
+        results = []
+        for index in range(count):
+            try:
+                image = ImageProcessor.preprocess_form_page_data_url(form_bytes, index)
+            except ImageQualityError as e:
+                results.append(e)
+                continue
+            self._observe_payloads([image])
+            results.append(self.registry.invoke(self.page_model, self._build_page_messages(image, index, count)))
+        return self._merge_pages(results, sources)
+
+    async def _aextract_pages(self, form_bytes: bytes, sources: Dict[str, int]) -> Dict:
+        '''
+        Render, preprocess and extract every page of a PDF/TIFF. At most FORM_PAGE_CONCURRENCY
+        pages are in flight, so memory stays flat however long the document is, while the
+        next page is rendered in the worker pool as the previous one waits on the model.
+        '''
+        count = await asyncio.to_thread(page_count, form_bytes)
+        semaphore = asyncio.Semaphore(self.page_concurrency)
+
+        async def extract_page(index: int):
+            async with semaphore:
+                image = await self.executor.preprocess_form_page(form_bytes, index)
+                self._observe_payloads([image])
+                return await self.registry.ainvoke(self.page_model, self._build_page_messages(image, index, count))
+
+        results = await asyncio.gather(*(extract_page(index) for index in range(count)), return_exceptions=True)
+        return self._merge_pages(results, sources)
+
+    def _prompt_version(self, form_bytes: bytes) -> str:
+        if is_paged(form_bytes):
+            return self.PAGE_PROMPT_VERSION
+        if self.mode == 'sections':
+            return f"{self.SECTION_PROMPT_VERSION}:{self.layout}"
+        return self.PROMPT_VERSION
+
+    @staticmethod
+    def _field_regions(sources: Dict[str, int]) -> Dict[str, tuple]:
+        '''(page, section) to crop for each validated field; page is None for single-image forms'''
+        return {field: (sources.get(field), FIELD_SECTIONS[field]) for field in validation.RULES['membership_form']}
+
+    def _region_layout(self, page) -> str:
+        # The section template describes a single-page form; a page of a longer document
+        # may carry any section anywhere, so re-read from the whole page
+        return self.layout if page is None else 'full'
+
+    @staticmethod
+    def _region_label(section: str, page) -> str:
+        if page is None:
+            return f"the {section} section of a membership form"
+        return f"page {page + 1} of a multi-page membership form"
+
+    @staticmethod
+    def _observe_payloads(images) -> None:
+        for image in images:
+            PAYLOAD_BYTES.labels('membership_form').observe(len(image))
+
+    @staticmethod
+    def _merge_sections(responses: list) -> Dict:
+        '''Combine the per-section results and validate them against the full form schema'''
+        merged = {}
+        for response in responses:
+            merged.update(response.model_dump())
+        return Membership_Form.model_validate(merged).model_dump()
+
+    @staticmethod
+    def _merge_pages(results: list, sources: Dict[str, int] = None) -> Dict:
+        '''
+        Combine per-page results in page order: the first page to fill a field wins and a
+        signature counts as present if any page shows it. Pages failing the quality gate
+        (e.g. blank backs) are skipped unless every page fails; other errors propagate.
+        `sources`, if given, is filled with the page index each field was taken from.
+        '''
+        sources = {} if sources is None else sources
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, ImageQualityError):
+                raise result
+        pages = [(index, result) for index, result in enumerate(results) if not isinstance(result, BaseException)]
+        if not pages:
+            raise_for_sides(results, sides=[f"page-{index + 1}" for index in range(len(results))])
+
+        merged = {}
+        for index, page in pages:
+            for name, value in page.model_dump().items():
+                if value is None:
+                    continue
+                if name.endswith('_signature_present'):
+                    merged[name] = merged.get(name) or value
+                elif merged.get(name) is None:
+                    merged[name] = value
+                    sources[name] = index
+        return Membership_Form.model_validate(merged).model_dump()
+
+    @staticmethod
+    def _build_page_messages(page_image: str, index: int, count: int) -> list:
+        '''Build the prompt for one preprocessed page of a multi-page form (base64 data URL)'''
+        fields = "\n                    ".join(f"- {name}" for name in Membership_Form_Page.model_fields)
+
+        return [
+            SystemMessage(
+                content=(
+                    f"""
+                    You are an information extraction assistant.
+                    You will be given page {index + 1} of {count} of a "Membership Form", preprocessed for optimal OCR.
+                    Other pages are read separately, so many fields will not appear on this page.
+
+                    Your task:
+                    - Extract only the fields listed below that have been filled in on this page.
+                    - If a field is blank or not on this page, do not include it in the JSON.
+                    - Dates must be returned in DD/MM/YYYY format.
+                    - Numbers (age, amount_paid) should be integers/floats, not strings.
+                    - For signatures: return True if a signature is present, False if absent.
+                    - Do not add extra keys or explanations — only return the JSON object.
+                    - Pay special attention to handwritten entries as they may appear bolder due to preprocessing.
+
+                    Schema fields to capture:
+                    {fields}
+                    """
+                )
+            ),
+            HumanMessage(
+                content=[
+                    {"type": "text", "text": f"Extract the filled details from page {index + 1} of this membership form."},
+                    {"type": "image_url", "image_url": {"url": page_image}}
+                ]
+            )
+        ]
+
+    @staticmethod
+    def _build_section_messages(section: str, section_image: str) -> list:
+        '''Build the prompt for one cropped form section (base64 data URL)'''
+        fields = "\n                    ".join(f"- {name}" for name in FORM_SECTION_SCHEMAS[section].model_fields)
+
+        return [
+            SystemMessage(
+                content=(
+                    f"""
+                    You are an information extraction assistant.
+                    You will be given the {section} section of a "Membership Form", cropped and preprocessed for optimal OCR.
+                    The crop may include parts of the neighbouring sections; ignore them.
+
+                    Your task:
+                    - Extract only the fields listed below that have been filled in.
+                    - If a field is blank, do not include it in the JSON.
+                    - Dates must be returned in DD/MM/YYYY format.
+                    - Numbers (age, amount_paid) should be integers/floats, not strings.
+                    - For signatures: return True if a signature is present, False if absent.
+                    - Do not add extra keys or explanations — only return the JSON object.
+                    - Pay special attention to handwritten entries as they may appear bolder due to preprocessing.
+
+                    Schema fields to capture:
+                    {fields}
+                    """
                 )
-            ]  
+            ),
+            HumanMessage(
+                content=[
+                    {"type": "text", "text": f"Extract the filled {section} details from this section of the membership form."},
+                    {"type": "image_url", "image_url": {"url": section_image}}
+                ]
+            )
+        ]
+
+    @staticmethod
+    def _build_messages(form_image: str) -> list:
+        '''Build the prompt for the preprocessed form image (base64 data URL)'''
 
-        response = self.structured_model.invoke(message)
-        return response.model_dump()
\ No newline at end of file
+        return [
+            SystemMessage(
+                content=(
+                    """
+                        You are an information extraction assistant.  
+                    You will be given an image of a "Membership Form" that has been preprocessed for optimal OCR.
+
+                    Your task:  
+                    - Extract only the fields that have been filled in the form.  
+                    - If a field is blank, do not include it in the JSON.  
+                    - Map the extracted values to the keys of the provided Pydantic schema.  
+                    - Dates must be returned in DD/MM/YYYY format.  
+                    - Numbers (age, amount_paid) should be integers/floats, not strings.  
+                    - For signatures: return True if a signature is present, False if absent.  
+                    - Do not add extra keys or explanations — only return the JSON object.  
+                    - Pay special attention to handwritten entries as they may appear bolder due to preprocessing.
+
+                    Schema fields to capture:  
+                    - applicant_name  
+                    - date_of_birth  
+                    - age  
+                    - pan_number  
+                    - aadhaar_card  
+                    - father_or_spouse_name  
+                    - address  
+                    - phone_mobile_no  
+                    - email_id  
+                    - occupation  
+                    - nationality  
+                    - nominee_name  
+                    - nominee_date_of_birth  
+                    - nominee_age  
+                    - nominee_sex  
+                    - nominee_relationship  
+                    - bank_name  
+                    - bank_account_no  
+                    - ifsc_code  
+                    - amount_paid  
+                    - amount_in_words  
+                    - introducer_name  
+                    - introducer_code_no  
+                    - introducer_signature_present  
+                    - member_signature_present  
+                    - official_signature_present  
+                    """
+                )
+            ),
+            HumanMessage(
+                content=[
+                    {"type": "text", "text": "Extract the filled details from this preprocessed membership form."},
+                    {"type": "image_url", "image_url": {"url": form_image}}
+                ]
+            )
+        ]
\ No newline at end of file
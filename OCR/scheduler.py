@@ -0,0 +1,271 @@
+from typing import Optional
+import asyncio
+import os
+import random
+import time
+from ImageProcessing.timing import stage
+
+
+def retryable_errors() -> tuple:
+    '''Failures worth retrying: quota, timeouts, dropped connections and 5xx from Azure'''
+    # openai is loaded with the model on first use, not when the service starts
+    import openai
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class LLMRateLimitError(RuntimeError):
+    '''Raised when the Azure quota is still exhausted after retrying; `retry_after` is a hint in seconds'''
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMDeadlineError(TimeoutError):
+    '''Raised when a model call cannot finish within its deadline'''
+
+
+def scheduler_enabled() -> bool:
+    return os.getenv("LLM_SCHEDULER", "true").lower() == "true"
+
+
+class TokenBucket:
+    '''
+    Refills continuously at `per_minute` units per minute. Bursts are capped at ten
+    seconds' worth, since Azure enforces its per-minute quotas over shorter windows.
+    '''
+
+    def __init__(self, per_minute: float) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 6)
+        self.available = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        '''Seconds until `amount` units are available (0 if they are now)'''
+        self.refill()
+        # A single call larger than the bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.available) / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.available -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    '''
+    Shared admission control for structured model calls.
+    A request and a token bucket keep the call rate under the deployment's RPM/TPM quota,
+    an AIMD limit caps calls in flight (halved on 429s and latency spikes, grown by one
+    per window of successes), and failed calls are retried with jittered exponential
+    backoff that honours Retry-After, all within a per-call deadline.
+    '''
+
+    def __init__(
+        self,
+        requests_per_minute: float = 250,
+        tokens_per_minute: float = 250000,
+        max_concurrency: int = 32,
+        initial_concurrency: int = 8,
+        deadline: float = 120,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30,
+        latency_spike_factor: float = 3.0,
+        image_tokens: int = 1000,
+        output_tokens: int = 2000
+    ) -> None:
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(min(self.max_concurrency, max(1, initial_concurrency)))
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency_spike_factor = latency_spike_factor
+        self.image_tokens = image_tokens
+        self.output_tokens = output_tokens
+        self._in_flight = 0
+        self._latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._blocked_until = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+        self._budget_lock: Optional[asyncio.Lock] = None
+        self._counters = {'calls': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'throttled': 0, 'deadline_exceeded': 0}
+
+    @classmethod
+    def from_env(cls) -> 'LLMScheduler':
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_RPM", "250")),
+            tokens_per_minute=float(os.getenv("LLM_TPM", "250000")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+            initial_concurrency=int(os.getenv("LLM_INITIAL_CONCURRENCY", "8")),
+            deadline=float(os.getenv("LLM_DEADLINE_SECONDS", "120")),
+            max_retries=int(os.getenv("LLM_SCHEDULER_RETRIES", "4")),
+            backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+            backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "30")),
+            latency_spike_factor=float(os.getenv("LLM_LATENCY_SPIKE_FACTOR", "3")),
+            image_tokens=int(os.getenv("LLM_IMAGE_TOKENS", "1000")),
+            output_tokens=int(os.getenv("LLM_OUTPUT_TOKENS", "2000"))
+        )
+
+    def estimate_tokens(self, messages: list) -> int:
+        '''Rough prompt + completion size: ~4 characters per text token plus a flat cost per image'''
+        chars = 0
+        images = 0
+        for message in messages:
+            content = message.content
+            parts = [content] if isinstance(content, str) else content
+            for part in parts:
+                if isinstance(part, str):
+                    chars += len(part)
+                elif part.get('type') == 'image_url':
+                    images += 1
+                else:
+                    chars += len(part.get('text', ''))
+        return chars // 4 + images * self.image_tokens + self.output_tokens
+
+    async def ainvoke(self, runnable, messages: list, deadline: Optional[float] = None):
+        '''Call runnable.ainvoke(messages) under the quota, concurrency limit and deadline'''
+        import openai
+
+        expires_at = time.monotonic() + (deadline or self.deadline)
+        cost = self.estimate_tokens(messages)
+        retryable = retryable_errors()
+        self._counters['calls'] += 1
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with stage('llm_wait'):
+                    await self._admit(cost, expires_at)
+            except (LLMRateLimitError, LLMDeadlineError):
+                self._counters['failed'] += 1
+                raise
+            started = time.monotonic()
+            try:
+                remaining = expires_at - started
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                response = await asyncio.wait_for(runnable.ainvoke(messages), timeout=remaining)
+            except asyncio.TimeoutError:
+                await self._release()
+                self._counters['failed'] += 1
+                self._counters['deadline_exceeded'] += 1
+                raise LLMDeadlineError(f"model call did not finish within {deadline or self.deadline:.0f}s")
+            except retryable as e:
+                throttled = isinstance(e, openai.RateLimitError)
+                await self._release(decrease=throttled)
+                retry_after = _retry_after(e)
+                if throttled:
+                    self._counters['throttled'] += 1
+                    if retry_after:
+                        # The quota is exhausted for at least this long; hold back other callers too
+                        self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+                delay = max(retry_after or 0.0, random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+                if attempt == self.max_retries or time.monotonic() + delay >= expires_at:
+                    self._counters['failed'] += 1
+                    if throttled:
+                        raise LLMRateLimitError("Azure OpenAI rate limit exceeded", retry_after or delay) from e
+                    raise
+                self._counters['retries'] += 1
+                with stage('llm_backoff'):
+                    await asyncio.sleep(delay)
+            except BaseException:
+                await self._release()
+                self._counters['failed'] += 1
+                raise
+            else:
+                latency = time.monotonic() - started
+                spike = self._latency is not None and latency > self.latency_spike_factor * self._latency
+                # Exponentially weighted baseline so one slow call does not move it much
+                self._latency = latency if self._latency is None else 0.9 * self._latency + 0.1 * latency
+                await self._release(decrease=spike, increase=not spike)
+                self._counters['succeeded'] += 1
+                return response
+
+    async def _admit(self, cost: int, expires_at: float) -> None:
+        '''Wait for a concurrency slot, then for enough request and token budget'''
+        condition = self._get_condition()
+        async with condition:
+            while self._in_flight >= int(self.limit):
+                remaining = expires_at - time.monotonic()
+                if remaining <= 0:
+                    self._counters['deadline_exceeded'] += 1
+                    raise LLMDeadlineError("timed out waiting for a model call slot")
+                try:
+                    await asyncio.wait_for(condition.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    continue
+            self._in_flight += 1
+
+        try:
+            # One caller at a time takes budget, so waiters are served in arrival order
+            async with self._budget_lock:
+                while True:
+                    now = time.monotonic()
+                    wait = max(self._blocked_until - now, self.requests.wait_time(1), self.tokens.wait_time(cost))
+                    if wait <= 0:
+                        break
+                    if now + wait >= expires_at:
+                        raise LLMRateLimitError("request would exceed the configured Azure quota before its deadline", wait)
+                    await asyncio.sleep(wait)
+                self.requests.take(1)
+                self.tokens.take(cost)
+        except BaseException:
+            await self._release()
+            raise
+
+    async def _release(self, decrease: bool = False, increase: bool = False) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            # Halve at most once per latency window so a burst of 429s does not collapse the limit to 1
+            if decrease and now - self._last_decrease > (self._latency or 1.0):
+                self.limit = max(1.0, self.limit / 2)
+                self._last_decrease = now
+            elif increase:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            condition.notify_all()
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Created lazily so they bind to the running event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+            self._budget_lock = asyncio.Lock()
+        return self._condition
+
+    def stats(self) -> dict:
+        self.requests.refill()
+        self.tokens.refill()
+        return {
+            **self._counters,
+            'concurrency_limit': round(self.limit, 2),
+            'in_flight': self._in_flight,
+            'requests_available': round(self.requests.available, 1),
+            'tokens_available': round(self.tokens.available),
+            'avg_latency_ms': None if self._latency is None else round(self._latency * 1000, 2)
+        }
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    '''Seconds from the retry-after-ms or retry-after header of an OpenAI error, if present'''
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        # HTTP-date form is not used by Azure OpenAI
+        return None
+    return None
@@ -0,0 +1,323 @@
+from datetime import datetime
+from functools import lru_cache
+from langchain_core.messages import SystemMessage, HumanMessage
+from pydantic import Field, create_model
+from typing import Awaitable, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+import asyncio
+import os
+import re
+from Service.metrics import FIELD_REPAIRS
+
+# Verhoeff dihedral group multiplication and position permutation tables
+_VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 2, 3, 4, 0, 6, 7, 8, 9, 5), (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7), (4, 0, 1, 2, 3, 9, 5, 6, 7, 8), (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2), (7, 6, 5, 9, 8, 2, 1, 0, 4, 3), (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0)
+)
+_VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 5, 7, 6, 2, 8, 3, 0, 9, 4), (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7), (9, 4, 5, 3, 1, 2, 6, 8, 7, 0), (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5), (7, 0, 4, 6, 9, 1, 3, 2, 5, 8)
+)
+
+_AADHAAR = re.compile(r'[2-9]\d{11}')
+# Masked Aadhaar (e-Aadhaar downloads, photocopies): 8 mask characters, then the last 4 digits
+_MASKED_AADHAAR = re.compile(r'[Xx*•]{8}(\d{4})')
+_PAN = re.compile(r'[A-Z]{5}\d{4}[A-Z]')
+_IFSC = re.compile(r'[A-Z]{4}0[A-Z0-9]{6}')
+_PINCODE = re.compile(r'[1-9]\d{5}')
+_YEAR = re.compile(r'(19|20)\d{2}')
+_DATE = re.compile(r'(\d{1,2})\s*[./\- ]\s*(\d{1,2})\s*[./\- ]\s*(\d{4})')
+_SPACING = re.compile(r'[\s-]+')
+
+
+def validation_enabled() -> bool:
+    return os.getenv("FIELD_VALIDATION", "true").lower() == "true"
+
+
+def repair_attempts() -> int:
+    return int(os.getenv("FIELD_REPAIR_ATTEMPTS", "1"))
+
+
+def verhoeff_valid(number: str) -> bool:
+    '''True if the digit string ends in the correct Verhoeff check digit'''
+    check = 0
+    for position, digit in enumerate(reversed(number)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[position % 8][int(digit)]]
+    return check == 0
+
+
+def _compact(value: str) -> str:
+    return _SPACING.sub('', value)
+
+
+def _compact_upper(value: str) -> str:
+    return _compact(value).upper()
+
+
+def _normalize_aadhaar(value: str) -> str:
+    '''Spacing removed; masked numbers such as xxxx-xxxx-1234 become XXXXXXXX1234'''
+    value = _compact(value)
+    masked = _MASKED_AADHAAR.fullmatch(value)
+    return f"XXXXXXXX{masked.group(1)}" if masked else value
+
+
+def _masked_aadhaar(value: str) -> bool:
+    return _MASKED_AADHAAR.fullmatch(value) is not None
+
+
+def _normalize_date(value: str) -> str:
+    '''5-8-1995, 05.08.1995 and similar become 05/08/1995'''
+    match = _DATE.fullmatch(value.strip())
+    if not match:
+        return value.strip()
+    day, month, year = match.groups()
+    return f"{int(day):02d}/{int(month):02d}/{year}"
+
+
+def _check_aadhaar(value: str) -> Optional[str]:
+    # Only the last 4 digits of a masked number are printed, so there is nothing to check
+    if _masked_aadhaar(value):
+        return None
+    if not _AADHAAR.fullmatch(value):
+        return "must be 12 digits, not starting with 0 or 1"
+    if not verhoeff_valid(value):
+        return "fails the Aadhaar (Verhoeff) checksum"
+    return None
+
+
+def _check_pan(value: str) -> Optional[str]:
+    return None if _PAN.fullmatch(value) else "must be 5 letters, 4 digits and a letter, e.g. ABCDE1234F"
+
+
+def _check_ifsc(value: str) -> Optional[str]:
+    return None if _IFSC.fullmatch(value) else "must be 4 letters, a zero and 6 letters or digits, e.g. SBIN0001234"
+
+
+def _check_pincode(value: str) -> Optional[str]:
+    return None if _PINCODE.fullmatch(value) else "must be 6 digits, not starting with 0"
+
+
+def _check_date(value: str) -> Optional[str]:
+    try:
+        datetime.strptime(value, '%d/%m/%Y')
+    except ValueError:
+        return "must be a real date in DD/MM/YYYY format"
+    return None
+
+
+def _check_birth_date(value: str) -> Optional[str]:
+    # Older cards print only the year of birth
+    return None if _YEAR.fullmatch(value) else _check_date(value)
+
+
+class FieldRule(NamedTuple):
+    description: str
+    normalize: Callable[[str], str]
+    check: Callable[[str], Optional[str]]
+    # True for values that are deliberately partial, e.g. masked Aadhaar numbers
+    masked: Optional[Callable[[str], bool]] = None
+
+
+RULES: Dict[str, Dict[str, FieldRule]] = {
+    'aadhaar': {
+        'aadhaar_number': FieldRule(
+            "the 12-digit Aadhaar number, digits only", _normalize_aadhaar, _check_aadhaar, _masked_aadhaar
+        ),
+        'date_of_birth': FieldRule(
+            "the date of birth in DD/MM/YYYY format, or the year of birth if only the year is printed",
+            _normalize_date, _check_birth_date
+        ),
+        'issue_date': FieldRule("the issue date in DD/MM/YYYY format", _normalize_date, _check_date),
+        'pincode': FieldRule("the 6-digit pincode of the address", _compact, _check_pincode)
+    },
+    'membership_form': {
+        'aadhaar_card': FieldRule(
+            "the applicant's 12-digit Aadhaar number, digits only", _normalize_aadhaar, _check_aadhaar, _masked_aadhaar
+        ),
+        'pan_number': FieldRule("the applicant's 10-character PAN number", _compact_upper, _check_pan),
+        'ifsc_code': FieldRule("the 11-character IFSC code of the bank", _compact_upper, _check_ifsc),
+        'date_of_birth': FieldRule("the applicant's date of birth in DD/MM/YYYY format", _normalize_date, _check_date),
+        'nominee_date_of_birth': FieldRule("the nominee's date of birth in DD/MM/YYYY format", _normalize_date, _check_date)
+    }
+}
+
+
+def invalid_fields(document: str, result: dict) -> Dict[str, str]:
+    '''
+    Normalise the validated fields of `result` in place (spacing, case, date separators)
+    and return the ones that are still invalid, with the reason. Missing fields are not checked.
+    '''
+    invalid = {}
+    for field, rule in RULES[document].items():
+        value = result.get(field)
+        if not isinstance(value, str):
+            continue
+        result[field] = value = rule.normalize(value)
+        reason = rule.check(value)
+        if reason:
+            invalid[field] = reason
+    return invalid
+
+
+def _record_masked(document: str, result: dict) -> None:
+    '''Count the normalised fields that hold masked values; they are valid and never re-read'''
+    for field, rule in RULES[document].items():
+        value = result.get(field)
+        if rule.masked is not None and isinstance(value, str) and rule.masked(value):
+            FIELD_REPAIRS.labels(document, field, 'masked').inc()
+
+
+@lru_cache(maxsize=None)
+def field_schema(document: str, field: str) -> type:
+    '''One-field schema for re-reading a single value, e.g. Aadhaar_Number_Field'''
+    name = '_'.join(part.capitalize() for part in field.split('_')) + '_Field'
+    description = f"{RULES[document][field].description}; null if it cannot be read"
+    return create_model(name, value=(Optional[str], Field(None, description=description)))
+
+
+def build_field_messages(document: str, field: str, value: str, reason: str, label: str, image: str) -> list:
+    '''Build the prompt for re-reading one field from a cropped region (base64 data URL)'''
+    return [
+        SystemMessage(
+            content=(
+                f"""
+                You are an information extraction assistant.
+                You will be given {label}, cropped and preprocessed for optimal OCR.
+
+                Your task:
+                - Read only {RULES[document][field].description} and return it as `value`.
+                - An earlier reading gave "{value}", which is invalid ({reason}). Read the characters again rather than correcting that value.
+                - Return the value exactly as printed or written; do not guess characters you cannot see.
+                - If it is not visible or cannot be read, return null.
+                """
+            )
+        ),
+        HumanMessage(
+            content=[
+                {"type": "text", "text": f"Read the {field.replace('_', ' ')} from this image."},
+                {"type": "image_url", "image_url": {"url": image}}
+            ]
+        )
+    ]
+
+
+def _accept(document: str, field: str, response) -> Optional[str]:
+    value = getattr(response, 'value', None)
+    if not isinstance(value, str):
+        return None
+    rule = RULES[document][field]
+    value = rule.normalize(value)
+    return value if rule.check(value) is None else None
+
+
+def _bands(invalid: Dict[str, str], regions: Dict[str, Tuple[Hashable, Hashable]]) -> Dict[Hashable, List[Hashable]]:
+    '''The distinct bands needed from each source (card side or page) for the invalid fields'''
+    bands: Dict[Hashable, List[Hashable]] = {}
+    for field in invalid:
+        source, band = regions[field]
+        if band not in bands.setdefault(source, []):
+            bands[source].append(band)
+    return bands
+
+
+def _record(document: str, field: str, value) -> str:
+    if isinstance(value, BaseException):
+        print(f"Re-reading {field} failed: {value}")
+        outcome = 'error'
+    else:
+        outcome = 'invalid' if value is None else 'repaired'
+    FIELD_REPAIRS.labels(document, field, outcome).inc()
+    return outcome
+
+
+async def arepair(
+    document: str,
+    result: dict,
+    registry,
+    regions: Dict[str, Tuple[Hashable, Hashable]],
+    crop: Callable[[Hashable, List[Hashable]], Awaitable[Dict[Hashable, Tuple[str, str]]]]
+) -> dict:
+    '''
+    Validate `result` locally and re-read only the fields that fail, each with a one-field
+    schema on a cropped region, all concurrently. `regions` maps fields to a (source, band)
+    pair, and crop(source, bands) returns a (description, data URL) pair per band, so each
+    card side or page is preprocessed once however many of its fields are re-read.
+    A field that is still invalid after FIELD_REPAIR_ATTEMPTS keeps its original reading.
+    '''
+    if not validation_enabled():
+        return result
+    result = dict(result)
+    invalid = invalid_fields(document, result)
+    _record_masked(document, result)
+    attempts = repair_attempts()
+    if not invalid or attempts <= 0:
+        for field in invalid:
+            FIELD_REPAIRS.labels(document, field, 'skipped').inc()
+        return result
+
+    crops = {source: asyncio.ensure_future(crop(source, bands)) for source, bands in _bands(invalid, regions).items()}
+
+    async def reread(field: str, reason: str) -> Optional[str]:
+        source, band = regions[field]
+        label, image = (await crops[source])[band]
+        model = registry.structured_model(field_schema(document, field))
+        for _ in range(attempts):
+            response = await registry.ainvoke(model, build_field_messages(document, field, result[field], reason, label, image))
+            value = _accept(document, field, response)
+            if value is not None:
+                return value
+        return None
+
+    values = await asyncio.gather(*(reread(field, reason) for field, reason in invalid.items()), return_exceptions=True)
+    for field, value in zip(invalid, values):
+        if _record(document, field, value) == 'repaired':
+            result[field] = value
+    return result
+
+
+def repair(
+    document: str,
+    result: dict,
+    registry,
+    regions: Dict[str, Tuple[Hashable, Hashable]],
+    crop: Callable[[Hashable, List[Hashable]], Dict[Hashable, Tuple[str, str]]]
+) -> dict:
+    '''Sync variant of arepair: fields are re-read one after another'''
+    if not validation_enabled():
+        return result
+    result = dict(result)
+    invalid = invalid_fields(document, result)
+    _record_masked(document, result)
+    attempts = repair_attempts()
+    bands = _bands(invalid, regions)
+    crops: Dict[Hashable, object] = {}
+
+    for field, reason in invalid.items():
+        if attempts <= 0:
+            FIELD_REPAIRS.labels(document, field, 'skipped').inc()
+            continue
+        try:
+            source, band = regions[field]
+            if source not in crops:
+                # A failed crop fails every field of that source without preprocessing it again
+                try:
+                    crops[source] = crop(source, bands[source])
+                except Exception as e:
+                    crops[source] = e
+            if isinstance(crops[source], Exception):
+                raise crops[source]
+            label, image = crops[source][band]
+            model = registry.structured_model(field_schema(document, field))
+            value = None
+            for _ in range(attempts):
+                response = registry.invoke(model, build_field_messages(document, field, result[field], reason, label, image))
+                value = _accept(document, field, response)
+                if value is not None:
+                    break
+        except Exception as e:
+            value = e
+        if _record(document, field, value) == 'repaired':
+            result[field] = value
+    return result
@@ -0,0 +1,4 @@
+from .batch import BatchItem, stream_ndjson
+from .jobs import JobQueue, MemoryJobStore, QueueFullError, SQLiteJobStore
+
+__all__ = ['BatchItem', 'stream_ndjson', 'JobQueue', 'MemoryJobStore', 'QueueFullError', 'SQLiteJobStore']
\ No newline at end of file
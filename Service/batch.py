@@ -0,0 +1,154 @@
+from typing import AsyncIterator, Awaitable, Callable, List, NamedTuple, Optional, Tuple
+import asyncio
+import json
+import os
+import re
+import zipfile
+from ImageProcessing.errors import ImageLimitError, ImageQualityError
+from ImageProcessing.uploads import max_upload_bytes, read_upload
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff')
+SIDE_PATTERN = re.compile(r'^(?P<prefix>.*?)[ _.-]*(?P<side>front|back)$', re.IGNORECASE)
+
+
+class BatchItem(NamedTuple):
+    '''
+    One unit of batch work. Loaders are only called once the item is scheduled,
+    so at most `concurrency` uploads are held in memory at a time.
+    '''
+    id: str
+    loaders: Tuple[Callable[[], bytes], ...]
+
+
+def default_concurrency() -> int:
+    return int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+
+def max_concurrency() -> int:
+    return int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+
+
+def collect_sources(uploads: Optional[list], archive) -> List[Tuple[str, Callable[[], bytes]]]:
+    '''
+    Return (name, loader) pairs for every uploaded file and every image inside the zip archive
+    '''
+    sources = []
+    for upload in uploads or []:
+        sources.append((upload.filename or f"file-{len(sources)}", _upload_loader(upload.file)))
+
+    if archive is not None:
+        try:
+            zf = zipfile.ZipFile(archive.file)
+        except zipfile.BadZipFile:
+            raise ValueError("archive is not a valid zip file")
+        for info in zf.infolist():
+            name = info.filename
+            if info.is_dir() or not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if os.path.basename(name).startswith('.') or name.startswith('__MACOSX/'):
+                continue
+            sources.append((name, _zip_loader(zf, name)))
+
+    if not sources:
+        raise ValueError("no documents were uploaded")
+    return sources
+
+
+def pair_aadhaar_sources(sources: List[Tuple[str, Callable[[], bytes]]]) -> List[BatchItem]:
+    '''
+    Group sources into front/back pairs.
+    Files named like `<id>_front.jpg` / `<id>_back.jpg` are paired by id,
+    otherwise consecutive files are treated as (front, back).
+    '''
+    sides = {}
+    for name, loader in sources:
+        stem = os.path.splitext(name)[0]
+        match = SIDE_PATTERN.match(stem)
+        if match is None:
+            break
+        key = (match.group('prefix'), match.group('side').lower())
+        if key in sides:
+            raise ValueError(f"duplicate {key[1]} image for '{key[0]}'")
+        sides[key] = loader
+    else:
+        prefixes = list(dict.fromkeys(prefix for prefix, _ in sides))
+        unpaired = [p for p in prefixes if (p, 'front') not in sides or (p, 'back') not in sides]
+        if unpaired:
+            raise ValueError(f"missing front or back image for: {', '.join(unpaired)}")
+        return [BatchItem(prefix, (sides[(prefix, 'front')], sides[(prefix, 'back')])) for prefix in prefixes]
+
+    if len(sources) % 2:
+        raise ValueError("aadhaar batches need an even number of images (front, back, front, back, ...)")
+    return [
+        BatchItem(sources[i][0], (sources[i][1], sources[i + 1][1]))
+        for i in range(0, len(sources), 2)
+    ]
+
+
+def single_sources(sources: List[Tuple[str, Callable[[], bytes]]]) -> List[BatchItem]:
+    return [BatchItem(name, (loader,)) for name, loader in sources]
+
+
+async def stream_ndjson(
+    items: List[BatchItem],
+    process: Callable[..., Awaitable[dict]],
+    concurrency: int
+) -> AsyncIterator[str]:
+    '''
+    Run process(*payloads) for every item with at most `concurrency` items in flight
+    and yield one NDJSON line per item as soon as it finishes.
+    A failing item produces an error line instead of failing the whole batch.
+    '''
+    pending = set()
+    queue = iter(enumerate(items))
+
+    def schedule() -> bool:
+        entry = next(queue, None)
+        if entry is None:
+            return False
+        pending.add(asyncio.create_task(_run_item(entry[0], entry[1], process)))
+        return True
+
+    try:
+        for _ in range(max(1, concurrency)):
+            if not schedule():
+                break
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                schedule()
+                yield json.dumps(task.result(), default=str) + "\n"
+    finally:
+        # Client went away or the stream was cancelled: stop outstanding work
+        for task in pending:
+            task.cancel()
+
+
+async def _run_item(index: int, item: BatchItem, process: Callable[..., Awaitable[dict]]) -> dict:
+    try:
+        payloads = await asyncio.gather(*(asyncio.to_thread(loader) for loader in item.loaders))
+        result = await process(*payloads)
+        return {"index": index, "id": item.id, "status": "ok", "result": result}
+    except ImageQualityError as e:
+        return {"index": index, "id": item.id, "status": "error", "error": str(e), "reasons": e.reasons}
+    except Exception as e:
+        print(f"Batch item {item.id} failed: {e}")
+        return {"index": index, "id": item.id, "status": "error", "error": str(e)}
+
+
+def _upload_loader(file) -> Callable[[], bytes]:
+    def load() -> bytes:
+        file.seek(0)
+        return read_upload(file)
+    return load
+
+
+def _zip_loader(zf: zipfile.ZipFile, name: str) -> Callable[[], bytes]:
+    def load() -> bytes:
+        # Check the declared size first so a zip bomb is never inflated
+        if zf.getinfo(name).file_size > max_upload_bytes():
+            raise ImageLimitError(f"{name} exceeds the {max_upload_bytes()} byte limit")
+        with zf.open(name) as member:
+            return read_upload(member)
+    return load
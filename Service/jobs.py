@@ -0,0 +1,356 @@
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit
+import asyncio
+import ipaddress
+import json
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import httpx
+from ImageProcessing.errors import ImageQualityError
+
+
+class QueueFullError(RuntimeError):
+    '''Raised when the job queue is at capacity; `retry_after` is a hint in seconds'''
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"job queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def callback_allowed_hosts() -> Set[str]:
+    return {host.strip().lower() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(',') if host.strip()}
+
+
+async def check_callback_url(url: str) -> None:
+    '''
+    Raise ValueError unless `url` is http(s) and its host is in JOB_CALLBACK_ALLOWED_HOSTS or,
+    when no allowlist is set, only resolves to public addresses. Job results carry personal
+    data, so they must not be POSTed to loopback, private or link-local (e.g. cloud metadata) hosts.
+    '''
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    allowed = callback_allowed_hosts()
+    if allowed:
+        if host not in allowed:
+            raise ValueError(f"callback_url host {host} is not in JOB_CALLBACK_ALLOWED_HOSTS")
+        return
+
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError(f"callback_url host {host} cannot be resolved")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise ValueError(f"callback_url host {host} resolves to a non-public address")
+
+
+class MemoryJobStore:
+    '''Job records in a dict; status is only visible to the process that accepted the job'''
+    blocking = False
+
+    def __init__(self) -> None:
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: dict) -> None:
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def purge(self, finished_before: float) -> int:
+        '''Drop finished jobs older than the given wall-clock time'''
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.get('finished_at') is not None and job['finished_at'] < finished_before
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            return len(expired)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteJobStore:
+    '''
+    Job records in a SQLite file, so any worker process sharing the file can answer a status poll.
+    Upload payloads stay in the accepting process's queue and are never written to disk.
+    '''
+    blocking = True
+
+    def __init__(self, path: str) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs "
+            "(id TEXT PRIMARY KEY, record TEXT NOT NULL, finished_at REAL)"
+        )
+        self._db.commit()
+
+    def create(self, job: dict) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, record, finished_at) VALUES (?, ?, ?)",
+                (job['id'], json.dumps(job, default=str), job.get('finished_at'))
+            )
+            self._db.commit()
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = {**json.loads(row[0]), **fields}
+            self._db.execute(
+                "UPDATE jobs SET record = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(job, default=str), job.get('finished_at'), job_id)
+            )
+            self._db.commit()
+            return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def purge(self, finished_before: float) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (finished_before,)
+            )
+            self._db.commit()
+            return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobQueue:
+    '''
+    Bounded in-process job queue drained by a fixed number of worker tasks.
+    Submitting returns immediately with a job id; the result is polled from the store
+    or POSTed to an optional callback URL. When the queue is full new jobs are
+    rejected with QueueFullError instead of waiting, so latency stays bounded under bursts.
+    '''
+    _default: Optional['JobQueue'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(
+        self,
+        store=None,
+        workers: int = 4,
+        max_queue: int = 100,
+        ttl_seconds: float = 3600,
+        callback_timeout: float = 10,
+        callback_retries: int = 3
+    ) -> None:
+        self.store = store or MemoryJobStore()
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.ttl_seconds = ttl_seconds
+        self.callback_timeout = callback_timeout
+        self.callback_retries = callback_retries
+        self._processors: Dict[str, Callable[..., Awaitable[dict]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._http: Optional[httpx.AsyncClient] = None
+        self._running = 0
+        self._reserved = 0
+        self._counters = {'submitted': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0, 'callbacks_failed': 0}
+        self._run_total = 0.0
+
+    def register(self, kind: str, process: Callable[..., Awaitable[dict]]) -> None:
+        '''Register the coroutine that handles jobs of a kind: process(*payloads, **params) -> result'''
+        self._processors[kind] = process
+
+    async def start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._http = httpx.AsyncClient(timeout=self.callback_timeout)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        self.store.close()
+
+    async def submit(
+        self,
+        kind: str,
+        payloads: Tuple[bytes, ...],
+        params: Optional[dict] = None,
+        callback_url: Optional[str] = None
+    ) -> dict:
+        '''Queue a job and return its record; raises QueueFullError when at capacity'''
+        if kind not in self._processors:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise RuntimeError("job queue is not running")
+        # Slots are reserved before the store writes so concurrent submits cannot overfill the queue
+        if self._queue.qsize() + self._reserved >= self.max_queue:
+            self._counters['rejected'] += 1
+            raise QueueFullError(self.retry_after())
+        self._reserved += 1
+
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'status': 'queued',
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'callback_url': callback_url,
+            'result': None,
+            'error': None
+        }
+        try:
+            await self._call_store(self.store.purge, now - self.ttl_seconds)
+            await self._call_store(self.store.create, job)
+            self._queue.put_nowait((job['id'], kind, payloads, params or {}, callback_url))
+        finally:
+            self._reserved -= 1
+        self._counters['submitted'] += 1
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self._call_store(self.store.get, job_id)
+
+    def retry_after(self) -> int:
+        '''Rough time in seconds until a queue slot frees up, from the average job duration'''
+        finished = self._counters['succeeded'] + self._counters['failed']
+        average = self._run_total / finished if finished else 5.0
+        return max(1, math.ceil(average / self.workers))
+
+    def stats(self) -> dict:
+        finished = self._counters['succeeded'] + self._counters['failed']
+        return {
+            **self._counters,
+            'workers': self.workers,
+            'running': self._running,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'max_queue': self.max_queue,
+            'avg_run_ms': round(self._run_total / finished * 1000, 2) if finished else 0.0,
+            'store': type(self.store).__name__
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, kind, payloads, params, callback_url = await self._queue.get()
+            self._running += 1
+            started = time.monotonic()
+            try:
+                await self._call_store(self.store.update, job_id, status='running', started_at=time.time())
+                try:
+                    result = await self._processors[kind](*payloads, **params)
+                    fields = {'status': 'succeeded', 'result': result}
+                    self._counters['succeeded'] += 1
+                except asyncio.CancelledError:
+                    raise
+                except ImageQualityError as e:
+                    fields = {'status': 'failed', 'error': str(e), 'reasons': e.reasons}
+                    self._counters['failed'] += 1
+                except Exception as e:
+                    print(f"Job {job_id} failed: {e}")
+                    fields = {'status': 'failed', 'error': str(e)}
+                    self._counters['failed'] += 1
+
+                self._run_total += time.monotonic() - started
+                job = await self._call_store(self.store.update, job_id, finished_at=time.time(), **fields)
+                if callback_url and job is not None:
+                    await self._send_callback(callback_url, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job {job_id} could not be recorded: {e}")
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+
+    async def _send_callback(self, url: str, job: dict) -> None:
+        # Checked again at send time in case the host now resolves elsewhere
+        try:
+            await check_callback_url(url)
+        except ValueError as e:
+            self._counters['callbacks_failed'] += 1
+            print(f"Callback for job {job['id']} to {url} refused: {e}")
+            return
+        body = json.dumps(job, default=str)
+        for attempt in range(self.callback_retries + 1):
+            try:
+                response = await self._http.post(url, content=body, headers={'Content-Type': 'application/json'})
+                if response.status_code < 500:
+                    return
+                error = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = str(e) or type(e).__name__
+            if attempt < self.callback_retries:
+                await asyncio.sleep(2 ** attempt)
+        self._counters['callbacks_failed'] += 1
+        print(f"Callback for job {job['id']} to {url} failed: {error}")
+
+    async def _call_store(self, fn, *args, **kwargs):
+        if self.store.blocking:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    @classmethod
+    def get_default(cls) -> 'JobQueue':
+        '''Return the process-wide job queue configured from the environment'''
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    backend = os.getenv("JOB_STORE", "memory")
+                    if backend == 'sqlite':
+                        store = SQLiteJobStore(os.getenv("JOB_STORE_PATH", "jobs.sqlite3"))
+                    elif backend == 'memory':
+                        store = MemoryJobStore()
+                    else:
+                        raise ValueError(f"Unknown job store: {backend}")
+                    cls._default = cls(
+                        store=store,
+                        workers=int(os.getenv("JOB_WORKERS", "4")),
+                        max_queue=int(os.getenv("JOB_QUEUE_SIZE", "100")),
+                        ttl_seconds=float(os.getenv("JOB_TTL_SECONDS", "3600")),
+                        callback_timeout=float(os.getenv("JOB_CALLBACK_TIMEOUT", "10")),
+                        callback_retries=int(os.getenv("JOB_CALLBACK_RETRIES", "3"))
+                    )
+        return cls._default
+
+    @classmethod
+    async def shutdown_default(cls) -> None:
+        with cls._default_lock:
+            instance, cls._default = cls._default, None
+        if instance is not None:
+            await instance.stop()
@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from typing import Callable, Dict, Iterator, Optional
+import os
+from ImageProcessing import timing
+
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_BYTE_BUCKETS = tuple(2 ** n for n in range(10, 26))
+
+STAGE_SECONDS = Histogram(
+    'ocr_stage_seconds', 'Time spent in each processing stage, summed over concurrent work',
+    ['document', 'stage'], buckets=_STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    'ocr_http_request_seconds', 'HTTP request latency', ['method', 'route', 'status'], buckets=_STAGE_BUCKETS
+)
+UPLOAD_BYTES = Histogram('ocr_upload_bytes', 'Size of each uploaded image', ['document'], buckets=_BYTE_BUCKETS)
+PAYLOAD_BYTES = Histogram(
+    'ocr_llm_payload_bytes', 'Size of the image data URLs sent to the model per call', ['document'], buckets=_BYTE_BUCKETS
+)
+LLM_TOKENS = Counter('ocr_llm_tokens', 'Tokens reported by Azure OpenAI', ['schema', 'type'])
+LLM_CALLS = Counter('ocr_llm_calls', 'Structured model calls by outcome', ['schema', 'outcome'])
+FIELD_REPAIRS = Counter(
+    'ocr_field_repairs', 'Fields that failed local validation, by outcome of re-reading them, and masked Aadhaar numbers', ['document', 'field', 'outcome']
+)
+
+
+class _StatsCollector:
+    '''Exposes the stats() dicts of the cache, worker pools and scheduler as gauges at scrape time'''
+
+    def __init__(self) -> None:
+        self.sources: Dict[str, Callable[[], Optional[dict]]] = {}
+
+    def collect(self):
+        for name, source in self.sources.items():
+            try:
+                stats = source()
+            except Exception as e:
+                print(f"Collecting {name} metrics failed: {e}")
+                continue
+            for key, value in (stats or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauge = GaugeMetricFamily(f"ocr_{name}_{key}", f"{name} {key.replace('_', ' ')}")
+                    gauge.add_metric([], value)
+                    yield gauge
+
+
+_stats_collector = _StatsCollector()
+REGISTRY.register(_stats_collector)
+
+
+def register_stats(name: str, source: Callable[[], Optional[dict]]) -> None:
+    '''Publish the numeric values of source() as ocr_<name>_<key> gauges'''
+    _stats_collector.sources[name] = source
+
+
+def observe_stages(document: str, timings: Dict[str, float]) -> None:
+    for name, seconds in timings.items():
+        STAGE_SECONDS.labels(document, name).observe(seconds)
+
+
+@contextmanager
+def track(document: str) -> Iterator[Dict[str, float]]:
+    '''Collect stage timings for work outside an HTTP request (batch items, queued jobs) and record them'''
+    with timing.collect() as timings:
+        try:
+            yield timings
+        finally:
+            observe_stages(document, timings)
+
+
+def render() -> bytes:
+    '''
+    Metrics in the Prometheus text format. With PROMETHEUS_MULTIPROC_DIR set, histograms
+    and counters are aggregated across uvicorn worker processes; gauges stay per process.
+    '''
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_stats_collector)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,100 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+import asyncio
+import importlib
+import os
+import time
+
+# Extractor class per document type; its module pulls in langchain and the image stack
+EXTRACTORS = {
+    'aadhaar': ('OCR.aadhaar', 'AadhaarExtractor'),
+    'membership_form': ('OCR.form', 'MembershipFormExtractor')
+}
+
+_timings: Dict[str, float] = {}
+# Filled only once an extractor module has finished importing; sys.modules already lists
+# a module while its import is still running
+_extractors: Dict[str, type] = {}
+_config_loaded = False
+
+
+def preload_enabled() -> bool:
+    return os.getenv("APP_PRELOAD", "false").lower() == "true"
+
+
+def load_config() -> None:
+    '''Load .env into the environment; only the first call in a process tree does any work'''
+    global _config_loaded
+    if _config_loaded:
+        return
+    with timed('config'):
+        from dotenv import load_dotenv
+        load_dotenv()
+    _config_loaded = True
+
+
+def record(phase: str, seconds: float) -> None:
+    '''Keep the first (cold) timing of each phase'''
+    _timings.setdefault(phase, seconds)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - started)
+
+
+def _import(document: str) -> type:
+    module, name = EXTRACTORS[document]
+    started = time.perf_counter()
+    # import_module waits on the module's import lock if another thread is importing it
+    cls = getattr(importlib.import_module(module), name)
+    if document not in _extractors:
+        record(f"import_{document}", time.perf_counter() - started)
+        _extractors[document] = cls
+    return cls
+
+
+async def extractor(document: str) -> type:
+    '''
+    The extractor class for a document type. Its module is imported on first use,
+    in a thread so the event loop keeps serving other requests meanwhile.
+    '''
+    cls = _extractors.get(document)
+    if cls is not None:
+        return cls
+    return await asyncio.to_thread(_import, document)
+
+
+def preload() -> None:
+    '''Import every extractor now, e.g. in the parent process before forking workers'''
+    with timed('preload'):
+        for document in EXTRACTORS:
+            _import(document)
+
+
+def process_age() -> Optional[float]:
+    '''Seconds since this process was started or forked (Linux only)'''
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22, counted after the parenthesised command name which may contain spaces
+            started_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(0.0, uptime - started_ticks / os.sysconf('SC_CLK_TCK'))
+
+
+def mark_ready() -> None:
+    age = process_age()
+    if age is not None:
+        record('ready', age)
+
+
+def stats() -> dict:
+    '''Seconds spent in each startup phase, including first-use imports so far'''
+    return {f"{phase}_seconds": round(seconds, 4) for phase, seconds in _timings.items()}
@@ -0,0 +1,54 @@
+'''
+Compare the PIL enhancement chain with the fused NumPy/OpenCV kernel.
+
+    python -m benchmarks.bench_enhance [image ...] [--repeat N]
+
+Without image arguments a synthetic noisy 1024 px card image is used.
+'''
+from PIL import Image
+import argparse
+import time
+import numpy as np
+from ImageProcessing.enhance import enhance_aadhaar_fused, enhance_aadhaar_pil
+
+
+def synthetic_card(width: int = 1024, height: int = 646, seed: int = 0) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(170, 235, width, dtype=np.float32)
+    base = np.repeat(gradient[None, :, None], height, axis=0).repeat(3, axis=2)
+    base[height // 3:height // 3 + 40, 80:width - 80] = 30
+    base[2 * height // 3:2 * height // 3 + 50, 200:width - 200] = 20
+    noisy = base + rng.normal(0, 12, base.shape)
+    return Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8), 'RGB')
+
+
+def time_per_image(fn, img: Image.Image, repeat: int) -> float:
+    fn(img)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(img)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    images = [(path, Image.open(path).convert('RGB')) for path in args.images] or [('synthetic', synthetic_card())]
+    for name, img in images:
+        img.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
+        pil_ms = time_per_image(enhance_aadhaar_pil, img, args.repeat)
+        fused_ms = time_per_image(enhance_aadhaar_fused, img, args.repeat)
+        diff = np.abs(
+            np.asarray(enhance_aadhaar_pil(img), np.int16) - np.asarray(enhance_aadhaar_fused(img), np.int16)
+        )
+        print(
+            f"{name} {img.size[0]}x{img.size[1]}: pil {pil_ms:.1f} ms, fused {fused_ms:.1f} ms, "
+            f"speedup {pil_ms / fused_ms:.1f}x, max abs diff {diff.max()}, mean abs diff {diff.mean():.3f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
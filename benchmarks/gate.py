@@ -0,0 +1,61 @@
+'''
+Check the image quality gate's verdicts on synthetic uploads.
+
+    python -m benchmarks.gate [--seeds N]
+
+Phone photos, flatbed scans, e-Aadhaar pages and images already cropped to the card must
+pass; blurred photos, cards far from the camera and photos with glare must be rejected
+for the expected check. Exits non-zero on any wrong verdict.
+'''
+from typing import Callable, List, Optional, Tuple
+import argparse
+import io
+import sys
+from ImageProcessing.processor import ImageProcessor
+from ImageProcessing.quality import ImageQualityError
+from . import synthetic
+
+# (name, upload, check that must reject it or None if it must pass)
+Case = Tuple[str, Callable[[], bytes], Optional[str]]
+
+
+def cases(seed: int) -> List[Case]:
+    found = []
+    for side in ('front', 'back'):
+        found.append((f"photo {side}", lambda side=side: synthetic.aadhaar_side(side, seed), None))
+        for layout in synthetic.SCAN_LAYOUTS:
+            found.append((f"{layout} {side}", lambda side=side, layout=layout: synthetic.aadhaar_scan(side, seed, layout), None))
+        found.append((f"blurred {side}", lambda side=side: synthetic.aadhaar_side(side, seed, blur=20.0), 'blur'))
+        found.append((f"small card {side}", lambda side=side: synthetic.aadhaar_side(side, seed, card_width=0.2), 'fill'))
+        found.append((f"glare {side}", lambda side=side: synthetic.aadhaar_side(side, seed, glare=0.4), 'glare'))
+    return found
+
+
+def verdict(data: bytes) -> List[str]:
+    '''The checks that reject the upload; empty if it passes'''
+    try:
+        ImageProcessor.preprocess_aadhaar_data_url(io.BytesIO(data))
+    except ImageQualityError as e:
+        return [reason['check'] for reason in e.reasons]
+    return []
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seeds', type=int, default=2)
+    args = parser.parse_args()
+
+    wrong = 0
+    for seed in range(args.seeds):
+        for name, upload, expected in cases(seed):
+            failed = verdict(upload())
+            ok = expected in failed if expected else not failed
+            wrong += not ok
+            print(f"{'ok' if ok else 'WRONG':<6} seed {seed}  {name:<20} expected {expected or 'pass':<6} got {', '.join(failed) or 'pass'}")
+    print(f"{wrong} wrong verdict(s)")
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
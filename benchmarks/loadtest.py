@@ -0,0 +1,177 @@
+'''
+End-to-end load test of main:app against the mock Azure endpoint.
+
+    python -m benchmarks.loadtest [--endpoint adhaar|member-form|jobs/adhaar|jobs/member-form]
+                                  [--requests 200] [--concurrency 16] [--variants 4]
+                                  [--latency 1.5] [--rpm 0] [--throttle-rate 0]
+                                  [--env NAME=VALUE ...] [--output report.json] [--baseline old.json]
+
+Starts the mock (benchmarks.mock_azure) and uvicorn main:app as subprocesses, or targets a
+running service with --target. The result cache is disabled unless --env CACHE_ENABLED=true
+is passed, so every request does the full work. Reports throughput, p50/p95/p99 latency,
+status counts and the peak RSS of the server process tree.
+'''
+from collections import Counter
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import time
+import httpx
+from . import report, synthetic
+
+
+def build_inputs(endpoint: str, variants: int, resolution) -> List[Dict[str, tuple]]:
+    '''Multipart file sets for the endpoint, one per synthetic document variant'''
+    inputs = []
+    for seed in range(variants):
+        if endpoint.endswith('adhaar'):
+            inputs.append({
+                'front_image': ('front.jpg', synthetic.aadhaar_side('front', seed, resolution), 'image/jpeg'),
+                'back_image': ('back.jpg', synthetic.aadhaar_side('back', seed + 1000, resolution), 'image/jpeg')
+            })
+        else:
+            inputs.append({'form_image': ('form.jpg', synthetic.membership_form(seed, resolution), 'image/jpeg')})
+    return inputs
+
+
+async def one_request(client: httpx.AsyncClient, endpoint: str, files: dict, poll_interval: float) -> int:
+    data = {'phone': '9876543210'} if endpoint.endswith('adhaar') else {}
+    response = await client.post(f"/{endpoint}", data=data, files=files)
+    if not endpoint.startswith('jobs/') or response.status_code != 202:
+        return response.status_code
+
+    # Job mode: latency runs until the job has finished
+    status_url = response.json()['status_url']
+    while True:
+        await asyncio.sleep(poll_interval)
+        job = (await client.get(status_url)).json()
+        if job['status'] == 'succeeded':
+            return 200
+        if job['status'] == 'failed':
+            return 500
+
+
+async def run_load(base_url: str, endpoint: str, inputs: list, requests: int, concurrency: int, poll_interval: float) -> dict:
+    latencies: List[float] = []
+    statuses = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=600, limits=limits) as client:
+        async def worker(i: int) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    status = await one_request(client, endpoint, inputs[i % len(inputs)], poll_interval)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                statuses[str(status)] += 1
+                if status == 200:
+                    latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+        server_stats = {}
+        for path in ('/llm/stats', '/preprocess/stats'):
+            with contextlib.suppress(httpx.HTTPError, ValueError):
+                server_stats[path] = (await client.get(path)).json()
+
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'statuses': dict(statuses),
+        'latency': report.summarize(latencies, elapsed),
+        'server_stats': server_stats
+    }
+
+
+def wait_until_up(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(httpx.HTTPError):
+            httpx.get(url, timeout=1)
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_services(args) -> list:
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    mock = subprocess.Popen([
+        sys.executable, '-m', 'benchmarks.mock_azure', '--port', str(args.mock_port),
+        '--latency', str(args.latency), '--jitter', str(args.jitter), '--rpm', str(args.rpm),
+        '--throttle-rate', str(args.throttle_rate)
+    ])
+    env = {**os.environ, 'OPENAI_API_BASE': mock_url, 'OPENAI_API_KEY': 'mock', 'CACHE_ENABLED': 'false'}
+    env.update(dict(item.split('=', 1) for item in args.env))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(args.port), '--log-level', 'warning'],
+        env=env
+    )
+    wait_until_up(f"{mock_url}/stats")
+    wait_until_up(f"http://127.0.0.1:{args.port}/")
+    return [server, mock]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoint', default='adhaar', choices=('adhaar', 'member-form', 'jobs/adhaar', 'jobs/member-form'))
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--variants', type=int, default=4, help='distinct synthetic documents to cycle through')
+    parser.add_argument('--width', type=int, default=synthetic.PHONE_RESOLUTION[0])
+    parser.add_argument('--height', type=int, default=synthetic.PHONE_RESOLUTION[1])
+    parser.add_argument('--target', help='URL of an already running service; skips starting the mock and server')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--mock-port', type=int, default=8100)
+    parser.add_argument('--latency', type=float, default=1.5)
+    parser.add_argument('--jitter', type=float, default=0.5)
+    parser.add_argument('--rpm', type=int, default=0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--poll-interval', type=float, default=0.25)
+    parser.add_argument('--env', nargs='*', default=[], help='extra NAME=VALUE settings for the server')
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    args = parser.parse_args()
+
+    print(f"Generating {args.variants} synthetic input sets...")
+    inputs = build_inputs(args.endpoint, args.variants, (args.width, args.height))
+
+    processes = [] if args.target else start_services(args)
+    base_url = args.target or f"http://127.0.0.1:{args.port}"
+    try:
+        result = asyncio.run(run_load(base_url, args.endpoint, inputs, args.requests, args.concurrency, args.poll_interval))
+        server_rss: Optional[int] = report.peak_rss_bytes(processes[0].pid) if processes else None
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    latency = result['latency']
+    print(f"{args.endpoint}: {latency.get('throughput_per_s', 0)} req/s, statuses {result['statuses']}")
+    if latency['count']:
+        print(f"latency p50 {latency['p50_ms']:.0f} ms  p95 {latency['p95_ms']:.0f} ms  p99 {latency['p99_ms']:.0f} ms")
+    if server_rss:
+        print(f"server peak RSS {server_rss / 2 ** 20:.1f} MiB")
+
+    name = f"loadtest.{args.endpoint}"
+    if args.output:
+        report.write_report(args.output, {
+            'benchmark': 'loadtest', 'environment': report.environment(),
+            'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+            'server_peak_rss_bytes': server_rss, 'client_peak_rss_bytes': report.peak_rss_bytes(),
+            'results': {name: {**latency, 'statuses': result['statuses']}},
+            'server_stats': result['server_stats']
+        })
+    if args.baseline and not report.compare({name: latency}, args.baseline):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+'''
+Local stand-in for the Azure OpenAI chat-completions endpoint, for load tests that must
+not spend tokens.
+
+    python -m benchmarks.mock_azure [--port 8100] [--latency 1.5] [--jitter 0.5]
+                                    [--rpm 300] [--throttle-rate 0.0] [--retry-after 2]
+
+Point the service at it with OPENAI_API_BASE=http://127.0.0.1:8100 and any OPENAI_API_KEY.
+Responses satisfy the requested schema (tool call or json_schema response format) with
+placeholder values (valid ones for the fields the service checks locally, so load tests do
+not trigger field re-reads). Requests over --rpm in a rolling minute, and a random --throttle-rate
+fraction of the rest, get 429 with Retry-After headers like Azure sends.
+'''
+from collections import deque
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+_PLACEHOLDERS = {'string': 'SYNTHETIC', 'integer': 30, 'number': 100.0, 'boolean': True}
+# Values passing OCR.validation, by field name
+_FIELD_VALUES = {
+    'aadhaar_number': '234123412346',
+    'aadhaar_card': '234123412346',
+    'pan_number': 'ABCDE1234F',
+    'ifsc_code': 'SBIN0001234',
+    'pincode': '110001',
+    'date_of_birth': '01/01/1990',
+    'nominee_date_of_birth': '01/01/2015',
+    'issue_date': '20/01/2018'
+}
+
+
+def placeholder(schema: dict, name: str = None):
+    '''A value that validates against a (pydantic-generated) JSON schema'''
+    if 'anyOf' in schema:
+        options = [option for option in schema['anyOf'] if option.get('type') != 'null']
+        return placeholder(options[0], name) if options else None
+    kind = schema.get('type')
+    if kind == 'object':
+        return {prop_name: placeholder(prop, prop_name) for prop_name, prop in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [placeholder(schema.get('items', {}))]
+    if kind == 'string' and name in _FIELD_VALUES:
+        return _FIELD_VALUES[name]
+    return _PLACEHOLDERS.get(kind)
+
+
+def create_app(latency: float = 1.5, jitter: float = 0.5, rpm: int = 0,
+               throttle_rate: float = 0.0, retry_after: float = 2.0) -> FastAPI:
+    app = FastAPI()
+    window = deque()
+    counters = {'requests': 0, 'throttled': 0}
+
+    @app.get('/stats')
+    async def stats():
+        return counters
+
+    @app.post('/openai/deployments/{deployment}/chat/completions')
+    async def chat_completions(deployment: str, request: Request):
+        counters['requests'] += 1
+        now = time.monotonic()
+        while window and now - window[0] > 60:
+            window.popleft()
+        if (rpm and len(window) >= rpm) or random.random() < throttle_rate:
+            counters['throttled'] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={'retry-after': str(int(retry_after)), 'retry-after-ms': str(int(retry_after * 1000))},
+                content={'error': {'code': '429', 'message': 'Requests to the deployment have exceeded the rate limit.'}}
+            )
+        window.append(now)
+
+        body = await request.json()
+        await asyncio.sleep(max(0.0, random.gauss(latency, jitter)))
+
+        message = {'role': 'assistant', 'content': None}
+        if body.get('tools'):
+            function = body['tools'][0]['function']
+            message['tool_calls'] = [{
+                'id': f"call_{uuid.uuid4().hex[:12]}",
+                'type': 'function',
+                'function': {'name': function['name'], 'arguments': json.dumps(placeholder(function['parameters']))}
+            }]
+        elif body.get('response_format', {}).get('type') == 'json_schema':
+            message['content'] = json.dumps(placeholder(body['response_format']['json_schema']['schema']))
+        else:
+            message['content'] = 'ok'
+
+        images = sum(
+            1 for m in body.get('messages', []) if isinstance(m.get('content'), list)
+            for part in m['content'] if part.get('type') == 'image_url'
+        )
+        prompt_tokens = len(json.dumps(body.get('messages', ''))) // 4 if not images else 500 + images * 800
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': deployment,
+            'choices': [{'index': 0, 'message': message, 'finish_reason': 'tool_calls' if body.get('tools') else 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 150, 'total_tokens': prompt_tokens + 150}
+        }
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', type=float, default=1.5, help='mean response time in seconds')
+    parser.add_argument('--jitter', type=float, default=0.5, help='standard deviation of the response time')
+    parser.add_argument('--rpm', type=int, default=0, help='requests per rolling minute before 429s (0 = unlimited)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests randomly answered with 429')
+    parser.add_argument('--retry-after', type=float, default=2.0)
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.jitter, args.rpm, args.throttle_rate, args.retry_after)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
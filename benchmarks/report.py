@@ -0,0 +1,101 @@
+'''
+Shared helpers for benchmark reports: latency percentiles, peak RSS and JSON
+reports that can be compared against a saved baseline.
+'''
+from typing import Dict, List, Optional
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import numpy as np
+
+
+def summarize(latencies: List[float], elapsed: Optional[float] = None) -> Dict[str, float]:
+    '''Latency percentiles in milliseconds, plus throughput when the wall-clock time is given'''
+    if not latencies:
+        return {'count': 0}
+    ms = np.asarray(latencies) * 1000
+    summary = {
+        'count': len(latencies),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3)
+    }
+    if elapsed:
+        summary['throughput_per_s'] = round(len(latencies) / elapsed, 3)
+    return summary
+
+
+def peak_rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    '''
+    Peak resident memory of this process, or of another process and all its
+    descendants (e.g. a server and its preprocessing workers) on Linux
+    '''
+    if pid is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return sum(filter(None, (_proc_hwm(p) for p in _process_tree(pid)))) or None
+
+
+def _process_tree(pid: int) -> List[int]:
+    pids = [pid]
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                for child in f.read().split():
+                    pids.extend(_process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def _proc_hwm(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def environment() -> dict:
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def write_report(path: str, report: dict) -> None:
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {path}")
+
+
+def compare(results: Dict[str, dict], baseline_path: str, metric: str = 'p50_ms', tolerance: float = 0.1) -> bool:
+    '''
+    Print the change of `metric` for every result present in the baseline report.
+    Returns False when any of them regressed by more than `tolerance` (a fraction).
+    '''
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+
+    ok = True
+    for name, result in results.items():
+        before = baseline.get(name, {}).get(metric)
+        after = result.get(metric)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(f"{name:<40} {metric} {before:>10.2f} -> {after:>10.2f} ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+    return ok
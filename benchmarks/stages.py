@@ -0,0 +1,119 @@
+'''
+Microbenchmarks for every ImageProcessor stage on synthetic (or supplied) phone photos.
+
+    python -m benchmarks.stages [--repeat N] [--cards PATH ...] [--forms PATH ...]
+                                [--output report.json] [--baseline old.json]
+
+Each stage runs on the output of the previous one, so timings match what the pipeline sees.
+'''
+from PIL import Image
+from typing import Callable, Dict, List
+import argparse
+import io
+import time
+import cv2
+import numpy as np
+from ImageProcessing.card import crop_card, crop_decode_size
+from ImageProcessing.decode import decode_reduced_cv2, open_reduced, probe_size
+from ImageProcessing.deskew import deskew
+from ImageProcessing.encoding import ImageEncoder, to_data_url
+from ImageProcessing.enhance import enhance_aadhaar_fused, enhance_aadhaar_pil
+from ImageProcessing.processor import ImageProcessor
+from ImageProcessing.quality import assess_quality
+from ImageProcessing.regions import locate_sections
+from . import report, synthetic
+
+
+def measure(fn: Callable[[], object], repeat: int) -> List[float]:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def aadhaar_stages(data: bytes) -> Dict[str, Callable[[], object]]:
+    size = probe_size(data)[:2]
+    decode_size = crop_decode_size(*size)
+    photo = open_reduced(data, decode_size).convert('RGB')
+    rgb = np.asarray(photo)
+    card = ImageProcessor._resize_image(crop_card(photo), 1024)
+    enhanced = enhance_aadhaar_fused(card)
+    jpeg = ImageEncoder('jpeg').encode(enhanced)
+    return {
+        'decode_full': lambda: Image.open(io.BytesIO(data)).convert('RGB'),
+        'decode_reduced': lambda: open_reduced(data, decode_size).convert('RGB'),
+        'quality': lambda: assess_quality(rgb, size, 'aadhaar'),
+        'crop_card': lambda: crop_card(photo),
+        'resize': lambda: ImageProcessor._resize_image(photo.copy(), 1024),
+        'enhance_pil': lambda: enhance_aadhaar_pil(card),
+        'enhance_fused': lambda: enhance_aadhaar_fused(card),
+        'encode_jpeg': lambda: ImageEncoder('jpeg').encode(enhanced),
+        'encode_png': lambda: ImageEncoder('png').encode(enhanced),
+        'encode_webp': lambda: ImageEncoder('webp').encode(enhanced),
+        'base64': lambda: to_data_url('image/jpeg', jpeg),
+        'pipeline': lambda: ImageProcessor.preprocess_aadhaar_data_url(io.BytesIO(data))
+    }
+
+
+def form_stages(data: bytes) -> Dict[str, Callable[[], object]]:
+    size = probe_size(data)[:2]
+    bgr = ImageProcessor._resize_opencv_image(decode_reduced_cv2(data, 1024), 1024)
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    binary = ImageProcessor._binarize_form(data)
+    png = ImageEncoder('png-bilevel').encode(binary)
+    return {
+        'decode_full': lambda: cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR),
+        'decode_reduced': lambda: decode_reduced_cv2(data, 1024),
+        'quality': lambda: assess_quality(gray, size, 'form'),
+        'deskew_hough': lambda: deskew(gray, 'hough'),
+        'deskew_probabilistic': lambda: deskew(gray, 'probabilistic'),
+        'deskew_projection': lambda: deskew(gray, 'projection'),
+        'binarize': lambda: cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 35, 11),
+        'locate_sections': lambda: locate_sections(np.asarray(binary), 'detect'),
+        'encode_png': lambda: ImageEncoder('png').encode(binary),
+        'encode_png_bilevel': lambda: ImageEncoder('png-bilevel').encode(binary),
+        'base64': lambda: to_data_url('image/png', png),
+        'pipeline': lambda: ImageProcessor.preprocess_form_data_url(io.BytesIO(data)),
+        'pipeline_sections': lambda: ImageProcessor.preprocess_form_section_data_urls(io.BytesIO(data), 'detect')
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--cards', nargs='*', default=[])
+    parser.add_argument('--forms', nargs='*', default=[])
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    args = parser.parse_args()
+
+    cards = [open(path, 'rb').read() for path in args.cards] or [synthetic.aadhaar_side('front', seed=1)]
+    forms = [open(path, 'rb').read() for path in args.forms] or [synthetic.membership_form(seed=1)]
+
+    results = {}
+    for document, inputs, stages in (('aadhaar', cards, aadhaar_stages), ('form', forms, form_stages)):
+        samples: Dict[str, List[float]] = {}
+        for data in inputs:
+            for name, fn in stages(data).items():
+                samples.setdefault(name, []).extend(measure(fn, args.repeat))
+        for name, latencies in samples.items():
+            key = f"{document}.{name}"
+            results[key] = summary = report.summarize(latencies)
+            print(f"{key:<32} p50 {summary['p50_ms']:>9.2f} ms  p95 {summary['p95_ms']:>9.2f} ms  p99 {summary['p99_ms']:>9.2f} ms")
+
+    peak = report.peak_rss_bytes()
+    print(f"peak RSS {peak / 2 ** 20:.1f} MiB")
+    if args.output:
+        report.write_report(args.output, {
+            'benchmark': 'stages', 'environment': report.environment(), 'repeat': args.repeat,
+            'peak_rss_bytes': peak, 'results': results
+        })
+    if args.baseline and not report.compare(results, args.baseline):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
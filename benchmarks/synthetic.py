@@ -0,0 +1,212 @@
+'''
+Synthetic Aadhaar card and membership form photos for benchmarks.
+
+    python -m benchmarks.synthetic OUT_DIR [--count N] [--width 4032 --height 3024] [--seed S]
+
+Cards are drawn at ID-1 proportions and placed in perspective on a textured background;
+forms are A4 pages with printed rules and handwriting-like strokes. Both get a random
+skew, optional blur and sensor noise, and are JPEG-encoded like a phone camera upload.
+aadhaar_scan() gives the flat, white-background uploads: flatbed scans, e-Aadhaar pages
+and images already cropped to the card.
+'''
+from typing import Tuple
+import argparse
+import os
+import cv2
+import numpy as np
+
+PHONE_RESOLUTION = (4032, 3024)
+# A4 at 300 dpi, and the ID-1 card width at that resolution
+SCAN_RESOLUTION = (2480, 3508)
+SCAN_CARD_WIDTH = 1011
+SCAN_LAYOUTS = ('flatbed', 'eaadhaar', 'crop')
+FORM_SECTIONS = ('APPLICANT DETAILS', 'NOMINEE DETAILS', 'BANK DETAILS', 'PAYMENT DETAILS', 'INTRODUCER', 'SIGNATURES')
+
+
+def aadhaar_side(side: str = 'front', seed: int = 0, resolution: Tuple[int, int] = PHONE_RESOLUTION,
+                 skew: float = None, blur: float = None, noise: float = 6.0, glare: float = 0.0,
+                 card_width: float = None) -> bytes:
+    '''
+    JPEG bytes of a phone photo of one side of a synthetic Aadhaar card, optionally with a
+    specular highlight covering `glare` of the card. `card_width` is the card's share of the
+    frame width, random between 0.45 and 0.65 by default.
+    '''
+    rng = np.random.default_rng(seed)
+    card = _draw_card(side, rng)
+    width, height = resolution
+    photo = _background(width, height, rng)
+
+    # Card covers roughly half the frame width, rotated and in mild perspective
+    card_w = int(width * (card_width if card_width is not None else rng.uniform(0.45, 0.65)))
+    card_h = int(card_w * card.shape[0] / card.shape[1])
+    cx, cy = width / 2 + rng.uniform(-0.1, 0.1) * width, height / 2 + rng.uniform(-0.1, 0.1) * height
+    angle = np.radians(skew if skew is not None else rng.uniform(-8, 8))
+    corners = np.array([[-card_w / 2, -card_h / 2], [card_w / 2, -card_h / 2], [card_w / 2, card_h / 2], [-card_w / 2, card_h / 2]])
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    target = corners @ rotation.T + [cx, cy] + rng.uniform(-0.02, 0.02, (4, 2)) * card_w
+    source = np.array([[0, 0], [card.shape[1], 0], [card.shape[1], card.shape[0]], [0, card.shape[0]]], np.float32)
+    matrix = cv2.getPerspectiveTransform(source, target.astype(np.float32))
+    warped = cv2.warpPerspective(card, matrix, (width, height))
+    mask = cv2.warpPerspective(np.full(card.shape[:2], 255, np.uint8), matrix, (width, height))
+    photo[mask > 0] = warped[mask > 0]
+
+    if glare > 0:
+        # An overexposed ellipse over the middle of the card, fading at its edge; it is
+        # clipped after the sensor noise, so its core stays pure white
+        axes = (int(card_w * np.sqrt(glare) * 0.6), int(card_h * np.sqrt(glare) * 0.55))
+        spot = np.zeros((height, width), np.float32)
+        cv2.ellipse(spot, (int(cx), int(cy)), axes, float(np.degrees(angle)), 0, 360, 1.0, -1)
+        spot = cv2.GaussianBlur(spot, (0, 0), max(axes) * 0.1)
+        photo = photo + spot[..., None] * 400
+
+    return _camera(photo, rng, blur, noise)
+
+
+def aadhaar_scan(side: str = 'front', seed: int = 0, layout: str = 'flatbed') -> bytes:
+    '''
+    JPEG bytes of a flat, evenly lit Aadhaar upload with a white background: 'flatbed' is
+    a card on a scanner lid, 'eaadhaar' a printed e-Aadhaar page and 'crop' the card alone
+    '''
+    rng = np.random.default_rng(seed)
+    card = _draw_card(side, rng)
+    # Scanners and PDF renders blow the card's off-white out to pure white
+    card[card >= 240] = 255
+    if layout == 'crop':
+        return _camera(card, rng, 0, 1.0)
+    if layout not in SCAN_LAYOUTS:
+        raise ValueError(f"Unknown scan layout '{layout}', expected one of {', '.join(SCAN_LAYOUTS)}")
+
+    width, height = SCAN_RESOLUTION
+    page = np.full((height, width, 3), 255, np.uint8)
+    card = cv2.resize(card, (SCAN_CARD_WIDTH, int(SCAN_CARD_WIDTH * card.shape[0] / card.shape[1])), interpolation=cv2.INTER_AREA)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    if layout == 'flatbed':
+        x, y = 150 + int(rng.integers(0, 200)), 150 + int(rng.integers(0, 200))
+        # Soft shadow along the card edge
+        cv2.rectangle(page, (x - 6, y - 6), (x + card.shape[1] + 6, y + card.shape[0] + 6), (200, 200, 200), -1)
+        page = cv2.GaussianBlur(page, (0, 0), 4)
+    else:
+        # Letter text above the card, which is printed with a thin cut-out border
+        for i in range(25):
+            cv2.putText(page, 'Unique Identification Authority of India ' * 2, (150, 300 + i * 70), font, 1.0, (40, 40, 40), 2, cv2.LINE_AA)
+        x, y = (width - card.shape[1]) // 2, height - card.shape[0] - 400
+        cv2.rectangle(page, (x - 3, y - 3), (x + card.shape[1] + 3, y + card.shape[0] + 3), (0, 0, 0), 2)
+    page[y:y + card.shape[0], x:x + card.shape[1]] = card
+    return _camera(page, rng, 0, 1.0)
+
+
+def membership_form(seed: int = 0, resolution: Tuple[int, int] = PHONE_RESOLUTION,
+                    skew: float = None, blur: float = None, noise: float = 6.0) -> bytes:
+    '''JPEG bytes of a phone photo of a filled-in synthetic membership form'''
+    rng = np.random.default_rng(seed)
+    page = _draw_form(rng)
+    # Forms are photographed in portrait
+    height, width = max(resolution), min(resolution)
+    photo = _background(width, height, rng)
+
+    scale = min(width / page.shape[1], height / page.shape[0]) * rng.uniform(0.85, 0.95)
+    page = cv2.resize(page, (int(page.shape[1] * scale), int(page.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    angle = skew if skew is not None else rng.uniform(-5, 5)
+    matrix = cv2.getRotationMatrix2D((page.shape[1] / 2, page.shape[0] / 2), angle, 1.0)
+    matrix[:, 2] += [(width - page.shape[1]) / 2, (height - page.shape[0]) / 2]
+    warped = cv2.warpAffine(page, matrix, (width, height))
+    mask = cv2.warpAffine(np.full(page.shape[:2], 255, np.uint8), matrix, (width, height))
+    photo[mask > 0] = warped[mask > 0]
+
+    return _camera(photo, rng, blur, noise)
+
+
+def _background(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    # Low-frequency texture like a desk or fabric
+    small = rng.integers(60, 140, (max(2, height // 64), max(2, width // 64), 3), dtype=np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+def _draw_card(side: str, rng: np.random.Generator) -> np.ndarray:
+    h, w = 1080, 1712
+    card = np.full((h, w, 3), 245, np.uint8)
+    # Tricolour header band and footer
+    card[:90] = (40, 120, 240)
+    card[90:120] = (255, 255, 255)
+    card[-70:] = (40, 40, 200)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    cv2.putText(card, 'GOVERNMENT OF INDIA', (520, 70), font, 1.8, (255, 255, 255), 4, cv2.LINE_AA)
+    digits = ' '.join(''.join(map(str, rng.integers(0, 10, 4))) for _ in range(3))
+
+    if side == 'front':
+        cv2.rectangle(card, (80, 200), (460, 700), (150, 150, 150), -1)
+        lines = ['Name: Synthetic Person', f"DOB: {rng.integers(1, 29):02d}/{rng.integers(1, 13):02d}/{rng.integers(1950, 2005)}", 'Gender: MALE']
+        for i, text in enumerate(lines):
+            cv2.putText(card, text, (540, 280 + i * 110), font, 1.8, (20, 20, 20), 4, cv2.LINE_AA)
+    else:
+        lines = ['Address: S/O Example Father,', '12 Sample Street, Ward 4,', 'Example Nagar, Delhi - 110001']
+        for i, text in enumerate(lines):
+            cv2.putText(card, text, (80, 260 + i * 110), font, 1.7, (20, 20, 20), 4, cv2.LINE_AA)
+        cv2.rectangle(card, (1250, 200), (1630, 580), (30, 30, 30), 6)
+    cv2.putText(card, digits, (520, 920), font, 3.0, (10, 10, 10), 8, cv2.LINE_AA)
+    return card
+
+
+def _draw_form(rng: np.random.Generator) -> np.ndarray:
+    # A4 at ~200 dpi
+    h, w = 2339, 1654
+    page = np.full((h, w, 3), 250, np.uint8)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    cv2.putText(page, 'MEMBERSHIP FORM', (520, 120), font, 2.0, (0, 0, 0), 5, cv2.LINE_AA)
+
+    y = 200
+    band = (h - y - 60) // len(FORM_SECTIONS)
+    for title in FORM_SECTIONS:
+        cv2.line(page, (60, y), (w - 60, y), (0, 0, 0), 4)
+        cv2.putText(page, title, (80, y + 50), font, 1.2, (0, 0, 0), 3, cv2.LINE_AA)
+        for row in range(y + 110, y + band - 30, 75):
+            cv2.putText(page, 'Field:', (100, row), font, 1.0, (0, 0, 0), 2, cv2.LINE_AA)
+            cv2.line(page, (260, row + 8), (w - 100, row + 8), (90, 90, 90), 2)
+            # Handwriting: a random polyline in blue ink over the field
+            xs = np.linspace(300, rng.integers(700, w - 150), 30)
+            ys = row - 12 + rng.normal(0, 6, xs.size)
+            cv2.polylines(page, [np.stack([xs, ys], 1).astype(np.int32)], False, (150, 60, 20), 3, cv2.LINE_AA)
+        y += band
+    cv2.line(page, (60, y), (w - 60, y), (0, 0, 0), 4)
+    return page
+
+
+def _camera(photo: np.ndarray, rng: np.random.Generator, blur: float, noise: float) -> bytes:
+    sigma = blur if blur is not None else rng.uniform(0, 1.5)
+    if sigma > 0:
+        photo = cv2.GaussianBlur(photo, (0, 0), sigma)
+    if noise > 0:
+        photo = photo + rng.normal(0, noise, photo.shape)
+    photo = np.clip(photo, 0, 255).astype(np.uint8)
+    ok, encoded = cv2.imencode('.jpg', photo, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return encoded.tobytes()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir')
+    parser.add_argument('--count', type=int, default=5)
+    parser.add_argument('--width', type=int, default=PHONE_RESOLUTION[0])
+    parser.add_argument('--height', type=int, default=PHONE_RESOLUTION[1])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    resolution = (args.width, args.height)
+    for i in range(args.count):
+        seed = args.seed + i
+        files = {
+            f"card-{i}_front.jpg": aadhaar_side('front', seed, resolution),
+            f"card-{i}_back.jpg": aadhaar_side('back', seed + 10000, resolution),
+            f"form-{i}.jpg": membership_form(seed, resolution)
+        }
+        for name, data in files.items():
+            with open(os.path.join(args.out_dir, name), 'wb') as f:
+                f.write(data)
+    print(f"Wrote {args.count * 3} images to {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
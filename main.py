@@ -1,25 +1,139 @@
-from OCR.aadhaar import AadhaarExtractor
-from OCR.form import MembershipFormExtractor
-from fastapi import FastAPI, Form, File, UploadFile, HTTPException
+import time
+
+# Timed from here so /startup/stats shows how long importing the service takes
+_import_started = time.perf_counter()
+
+# Only light modules are imported here: the extractors, and with them langchain, OpenCV and
+# NumPy, are loaded on the first request for each document type (see Service.startup)
+from OCR.cache import ExtractionCache
+from OCR.client import LLMClientRegistry
+from OCR.scheduler import LLMDeadlineError, LLMRateLimitError, scheduler_enabled
+from ImageProcessing.errors import ImageLimitError, ImageQualityError, UnsupportedDocumentError
+from ImageProcessing import timing
+from ImageProcessing.executor import PreprocessExecutor
+from ImageProcessing.uploads import read_upload
+from Service import batch, metrics, startup
+from Service.jobs import JobQueue, QueueFullError, check_callback_url
+from fastapi import APIRouter, FastAPI, Form, File, Request, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Annotated
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+from typing import Annotated, List, Optional
+import asyncio
+import io
+import math
+import os
+
+# Routes whose stage timings are recorded in the ocr_stage_seconds histogram
+DOCUMENT_ROUTES = {'/adhaar': 'aadhaar', '/member-form': 'membership_form'}
+
+async def process_aadhaar_job(front: bytes, back: bytes, phone: int) -> dict:
+    AadhaarExtractor = await startup.extractor('aadhaar')
+    with metrics.track('aadhaar'):
+        result = await AadhaarExtractor(io.BytesIO(front), io.BytesIO(back)).aread_aadhaar()
+    result['phone_number'] = phone
+    return result
+
+async def process_form_job(form: bytes) -> dict:
+    MembershipFormExtractor = await startup.extractor('membership_form')
+    with metrics.track('membership_form'):
+        return await MembershipFormExtractor(io.BytesIO(form)).aread_form()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup.timed('lifespan'):
+        preload = startup.preload_enabled()
+        if preload:
+            # Nothing left to import when serve.py preloaded before forking this worker
+            await asyncio.to_thread(startup.preload)
+        connect = os.getenv("LLM_WARMUP", "false").lower() == "true"
+        # Build the pooled LLM client once per worker process, before the first request
+        registry = await asyncio.to_thread(LLMClientRegistry.get)
+        await registry.warmup(connect=connect)
+        await PreprocessExecutor.get_default().warmup(preload=preload)
+        jobs = JobQueue.get_default()
+        jobs.register('aadhaar', process_aadhaar_job)
+        jobs.register('membership_form', process_form_job)
+        await jobs.start()
+    startup.mark_ready()
+    yield
+    await JobQueue.shutdown_default()
+    PreprocessExecutor.shutdown_default()
+    await LLMClientRegistry.shutdown()
+    ExtractionCache.shutdown()
+
+router = APIRouter()
 
-app = FastAPI()
+def cache_stats_or_none() -> Optional[dict]:
+    cache = ExtractionCache.get_default()
+    return cache.stats() if cache is not None else None
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def scheduler_stats_or_none() -> Optional[dict]:
+    # Scrapes must not build the LLM client (and import langchain) before the first request does
+    registry = LLMClientRegistry.current()
+    scheduler = registry.scheduler if registry is not None else None
+    return scheduler.stats() if scheduler is not None else None
 
-@app.get("/")
+metrics.register_stats('cache', cache_stats_or_none)
+metrics.register_stats('preprocess', lambda: PreprocessExecutor.get_default().stats())
+metrics.register_stats('jobs', lambda: JobQueue.get_default().stats())
+metrics.register_stats('llm', scheduler_stats_or_none)
+metrics.register_stats('startup', startup.stats)
+
+async def record_timings(request: Request, call_next):
+    """Time every request per stage; report it in Server-Timing and the Prometheus histograms"""
+    started = time.perf_counter()
+    with timing.collect() as timings:
+        response = await call_next(request)
+    total = time.perf_counter() - started
+
+    route = request.scope.get('route')
+    path = route.path if route is not None else 'unmatched'
+    metrics.REQUEST_SECONDS.labels(request.method, path, response.status_code).observe(total)
+    if path in DOCUMENT_ROUTES:
+        metrics.observe_stages(DOCUMENT_ROUTES[path], timings)
+    response.headers['Server-Timing'] = timing.server_timing(timings, total)
+    return response
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: per-stage latency, payload sizes, LLM usage and pool/cache/queue gauges"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/")
 async def root():
     return {"message": "OCR Service is running!"}
 
-@app.post('/adhaar')
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit, miss and eviction counters for the extraction result cache"""
+    cache = ExtractionCache.get_default()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@router.get("/llm/stats")
+async def llm_stats():
+    """Concurrency limit, remaining quota budget and retry counters of the model call scheduler"""
+    registry = LLMClientRegistry.current()
+    if registry is None:
+        # No model call yet; the scheduler is created along with the LLM client
+        return {"enabled": scheduler_enabled(), "started": False}
+    if registry.scheduler is None:
+        return {"enabled": False}
+    return {"enabled": True, **registry.scheduler.stats()}
+
+@router.get("/startup/stats")
+async def startup_stats():
+    """Seconds spent loading config, importing, preloading and starting up, plus first-use imports"""
+    return {"preload": startup.preload_enabled(), **startup.stats()}
+
+@router.get("/preprocess/stats")
+async def preprocess_stats():
+    """Queue depth and wait time of the preprocessing worker pool"""
+    return PreprocessExecutor.get_default().stats()
+
+@router.post('/adhaar')
 async def extract_aadhaar(
     phone: Annotated[int, Form(..., description='Enter Your Number')],
     front_image: Annotated[UploadFile, File(..., description='Front Image')],
@@ -31,27 +145,175 @@ async def extract_aadhaar(
     read_aadhaar method to extract the information.
     """
     try:
+        AadhaarExtractor = await startup.extractor('aadhaar')
         aadhaar_extractor = AadhaarExtractor(
             user_aadhaar_image_front=front_image.file,
             user_aadhaar_image_back=back_image.file
         )
-        result = aadhaar_extractor.read_aadhaar()
+        result = await aadhaar_extractor.aread_aadhaar()
         result['phone_number'] = phone
 
         return result
+    except ImageLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ImageQualityError as e:
+        raise HTTPException(status_code=422, detail={"message": "Image quality check failed", "reasons": e.reasons})
+    except LLMRateLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except LLMDeadlineError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
 
-@app.post('/member-form')
-async def extract_membership_form(form_image: Annotated[UploadFile, File(..., description='Form Image')]):
+@router.post('/member-form')
+async def extract_membership_form(form_image: Annotated[UploadFile, File(..., description='Form image, or a multi-page PDF/TIFF')]):
     '''
     This functions prompts the user for the form image, forms a MembershipFormExtractor object
     and extracts the user information
     '''
     try:
+        MembershipFormExtractor = await startup.extractor('membership_form')
         form_extractor = MembershipFormExtractor(form_image.file)
-        result = form_extractor.read_form()
+        result = await form_extractor.aread_form()
 
         return result
+    except ImageLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedDocumentError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ImageQualityError as e:
+        raise HTTPException(status_code=422, detail={"message": "Image quality check failed", "reasons": e.reasons})
+    except LLMRateLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except LLMDeadlineError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f'An Error Occurred: {e}')
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f'An Error Occurred: {e}')
+
+@router.post('/batch/adhaar')
+async def batch_extract_aadhaar(
+    files: Annotated[Optional[List[UploadFile]], File(description='Aadhaar images named <id>_front / <id>_back, or ordered front, back, ...')] = None,
+    archive: Annotated[Optional[UploadFile], File(description='Zip archive of Aadhaar images')] = None,
+    concurrency: Annotated[Optional[int], Form(ge=1, description='Max cards processed at once')] = None
+):
+    '''
+    Extract many Aadhaar cards in one request and stream one NDJSON line per card
+    as soon as it finishes. Failures are reported per card.
+    '''
+    try:
+        items = batch.pair_aadhaar_sources(batch.collect_sources(files, archive))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def process(front: bytes, back: bytes) -> dict:
+        AadhaarExtractor = await startup.extractor('aadhaar')
+        with metrics.track('aadhaar'):
+            return await AadhaarExtractor(io.BytesIO(front), io.BytesIO(back)).aread_aadhaar()
+
+    limit = min(concurrency or batch.default_concurrency(), batch.max_concurrency())
+    return StreamingResponse(batch.stream_ndjson(items, process, limit), media_type='application/x-ndjson')
+
+@router.post('/batch/member-form')
+async def batch_extract_membership_forms(
+    files: Annotated[Optional[List[UploadFile]], File(description='Form images')] = None,
+    archive: Annotated[Optional[UploadFile], File(description='Zip archive of form images')] = None,
+    concurrency: Annotated[Optional[int], Form(ge=1, description='Max forms processed at once')] = None
+):
+    '''
+    Extract many membership forms in one request and stream one NDJSON line per form
+    as soon as it finishes. Failures are reported per form.
+    '''
+    try:
+        items = batch.single_sources(batch.collect_sources(files, archive))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def process(form: bytes) -> dict:
+        MembershipFormExtractor = await startup.extractor('membership_form')
+        with metrics.track('membership_form'):
+            return await MembershipFormExtractor(io.BytesIO(form)).aread_form()
+
+    limit = min(concurrency or batch.default_concurrency(), batch.max_concurrency())
+    return StreamingResponse(batch.stream_ndjson(items, process, limit), media_type='application/x-ndjson')
+
+async def submit_job(kind: str, uploads: list, params: dict, callback_url: Optional[str]) -> JSONResponse:
+    """Read the uploads, queue the job and answer 202 with where to poll for it"""
+    if callback_url:
+        try:
+            await check_callback_url(callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        payloads = await asyncio.gather(*(asyncio.to_thread(read_upload, upload.file) for upload in uploads))
+        job = await JobQueue.get_default().submit(kind, tuple(payloads), params, callback_url)
+    except ImageLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    status_url = f"/jobs/{job['id']}"
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job['id'], "status": job['status'], "status_url": status_url},
+        headers={"Location": status_url}
+    )
+
+@router.post('/jobs/adhaar', status_code=202)
+async def submit_aadhaar_job(
+    phone: Annotated[int, Form(..., description='Enter Your Number')],
+    front_image: Annotated[UploadFile, File(..., description='Front Image')],
+    back_image: Annotated[UploadFile, File(..., description='Back Image')],
+    callback_url: Annotated[Optional[str], Form(description='URL that receives the finished job as a JSON POST')] = None
+):
+    """
+    Queue an Aadhaar extraction and return immediately with a job id.
+    Poll /jobs/{job_id} for the result or pass a callback_url.
+    """
+    return await submit_job('aadhaar', [front_image, back_image], {'phone': phone}, callback_url)
+
+@router.post('/jobs/member-form', status_code=202)
+async def submit_membership_form_job(
+    form_image: Annotated[UploadFile, File(..., description='Form Image')],
+    callback_url: Annotated[Optional[str], Form(description='URL that receives the finished job as a JSON POST')] = None
+):
+    """
+    Queue a membership form extraction and return immediately with a job id.
+    Poll /jobs/{job_id} for the result or pass a callback_url.
+    """
+    return await submit_job('membership_form', [form_image], {}, callback_url)
+
+@router.get('/jobs/stats')
+async def job_stats():
+    """Queue depth, running jobs and rejection counters of the job queue"""
+    return JobQueue.get_default().stats()
+
+@router.get('/jobs/{job_id}')
+async def get_job(job_id: str):
+    """Status of a queued job, with its result or error once finished"""
+    job = await JobQueue.get_default().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found or expired")
+    return job
+
+def create_app() -> FastAPI:
+    """
+    Build the application. Config is loaded once per process tree; the extractors are imported
+    on first use, or up front with APP_PRELOAD (serve.py preloads once and then forks workers).
+    """
+    startup.load_config()
+    app = FastAPI(lifespan=lifespan)
+
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(record_timings)
+    app.include_router(router)
+    return app
+
+app = create_app()
+startup.record('import', time.perf_counter() - _import_started)
\ No newline at end of file
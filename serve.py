@@ -0,0 +1,105 @@
+'''
+Run the service, optionally as several uvicorn workers forked from one preloaded parent.
+
+    python serve.py [--host 127.0.0.1] [--port 8000] [--workers N] [--no-preload]
+
+The parent loads config, imports main and (unless --no-preload) every extractor with
+langchain, OpenCV and NumPy, then binds the socket and forks the workers. The workers share
+those read-only pages copy-on-write instead of each importing everything again, and only
+build their own LLM client and preprocessing pool. Workers that die are replaced.
+WEB_CONCURRENCY sets the default number of workers.
+'''
+import argparse
+import contextlib
+import gc
+import os
+import signal
+import time
+import traceback
+
+
+def run_worker(config, sock) -> None:
+    import uvicorn
+    # uvicorn installs its own graceful-shutdown handlers in place of the supervisor's
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(config, sock) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(config, sock)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            # Never return into the supervisor loop in the child
+            os._exit(code)
+    return pid
+
+
+def supervise(config, sock, workers: int) -> None:
+    children = set()
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        children.add(spawn(config, sock))
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}, starting a replacement")
+            time.sleep(1)
+            children.add(spawn(config, sock))
+
+
+def main() -> None:
+    from Service import startup
+    # Before parsing arguments so WEB_CONCURRENCY can come from .env
+    startup.load_config()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument('--no-preload', action='store_true', help='import the extractors on first use in each worker')
+    parser.add_argument('--log-level', default='info')
+    args = parser.parse_args()
+
+    # Inherited by the workers, whose lifespans then only warm their own clients and pools
+    os.environ['APP_PRELOAD'] = 'false' if args.no_preload else 'true'
+    import uvicorn
+    from main import app
+    if not args.no_preload:
+        startup.preload()
+
+    config = uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level)
+    if args.workers <= 1:
+        uvicorn.Server(config).run()
+        return
+
+    sock = config.bind_socket()
+    # Keep everything imported so far out of garbage collection, which would otherwise
+    # write to (and so copy) the shared pages in every worker
+    gc.freeze()
+    supervise(config, sock, args.workers)
+
+
+if __name__ == '__main__':
+    main()